@@ -1,7 +1 @@
-from final import Search
-
-def agent(board, player, var):
-    print(f"Ply: {var[0]}")
-    ai = Search(board, player)
-    piece, move_opt = ai.search(3)
-    return piece, move_opt
\ No newline at end of file
+from final import agent, end_game, ponder, stop_ponder
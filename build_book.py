@@ -0,0 +1,23 @@
+# Python 3.11+
+import argparse
+from itertools import cycle
+from chessmaker.chess.base import Board
+from samples import white, black, sample0, sample1
+from final import BOOK_PATH, BOOK_PLIES, build_opening_book
+
+
+def make_layout(board_sample):
+    players = [white, black]
+    return Board(squares=board_sample, players=players, turn_iterator=cycle(players))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="search the openings of the sample layouts into a book")
+    parser.add_argument("--path", default=BOOK_PATH)
+    parser.add_argument("--plies", type=int, default=BOOK_PLIES)
+    parser.add_argument("--time", type=float, default=10.0, help="seconds per position")
+    parser.add_argument("--depth", type=int, default=None, help="deepest iteration per position")
+    args = parser.parse_args()
+    layouts = [make_layout(sample0), make_layout(sample1)]
+    count = build_opening_book(layouts, args.path, args.plies, args.time, args.depth)
+    print(f"{count} positions written to {args.path}")
@@ -0,0 +1,11 @@
+# Python 3.11+
+import argparse
+from final import TABLEBASE_DIR, build_tablebases
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="solve the endgame tablebases of up to four pieces")
+    parser.add_argument("--path", default=TABLEBASE_DIR, help="folder the tables are written to")
+    args = parser.parse_args()
+    names = build_tablebases(args.path)
+    print(f"{len(names)} tables written to {args.path}")
@@ -0,0 +1,36 @@
+# Python 3.11+
+import argparse
+import random
+from itertools import cycle
+from chessmaker.chess.base import Board
+from samples import white, black, sample0, sample1
+from final import BitBoard
+
+
+def make_layout(board_sample):
+    players = [white, black]
+    return Board(squares=board_sample, players=players, turn_iterator=cycle([white, black]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="play random games from the sample layouts, cross checking every legal move list against chessmaker"
+    )
+    parser.add_argument("--games", type=int, default=20, help="games per layout")
+    parser.add_argument("--plies", type=int, default=60, help="longest game")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    BitBoard.check_legal_moves = True
+    rng = random.Random(args.seed)
+    positions = 0
+    for board_sample in (sample0, sample1):
+        start = BitBoard.from_board(make_layout(board_sample))
+        for _ in range(args.games):
+            board = start.copy()
+            for _ in range(args.plies):
+                moves = board.legal_moves()
+                positions += 1
+                if not moves or board.only_kings():
+                    break
+                board.make_move(rng.choice(moves))
+    print(f"{positions} positions checked, no mismatches")
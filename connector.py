@@ -36,6 +36,7 @@ HEARTBEAT_INTERVAL = 5  # seconds
 MOVE_TIMEOUT = 14  # seconds (platform enforced)
 RECONNECT_DELAY = 3  # seconds
 MAX_GAMES_PER_SESSION = int(os.getenv("MAX_GAMES_PER_SESSION", "0"))  # 0 = unlimited
+PONDER = os.getenv("PONDER", "1") != "0"  # search on the opponent's time if the agent supports it
 CANCELLED_RESULTS = {"cancelled", "error", "no_moves"}
 
 class LocalAgentConnector:
@@ -56,6 +57,8 @@ class LocalAgentConnector:
         self.shutdown_pending = False
         self.primary_game_id = None
         self.last_status_sent = None
+        self.ponder_task = None
+        self.ponder_player = None
 
     async def load_agent(self):
         """Load the local agent.py file"""
@@ -249,12 +252,42 @@ class LocalAgentConnector:
                 self.connected = False
                 break
 
+    def start_pondering(self, player):
+        """Let the agent search on the opponent's time until the next request"""
+        ponder = getattr(self.agent_module, "ponder", None)
+        if not PONDER or ponder is None or not hasattr(self.agent_module, "stop_ponder"):
+            return
+        self.ponder_player = player
+        self.ponder_task = asyncio.create_task(asyncio.to_thread(ponder, player))
+
+    async def stop_pondering(self):
+        """Stop a running ponder and wait for it so the agent is free to move"""
+        if self.ponder_task is None:
+            return
+        task, self.ponder_task = self.ponder_task, None
+        self.agent_module.stop_ponder(self.ponder_player)
+        try:
+            await task
+        except Exception as e:
+            print(f"Ponder error: {e}")
+
+    async def end_game(self):
+        """Let the agent save what it learnt during the game, if it supports it"""
+        end_game = getattr(self.agent_module, "end_game", None)
+        if end_game is None:
+            return
+        try:
+            await asyncio.to_thread(end_game)
+        except Exception as e:
+            print(f"End game error: {e}")
+
     async def shutdown(self, reason: str = ""):
         """Stop connector and close any active connections"""
         if self._shutdown_started:
             return
 
         self._shutdown_started = True
+        await self.stop_pondering()
         if self.last_status_sent != "disconnecting":
             await self.send_status("disconnecting")
         if reason:
@@ -432,6 +465,7 @@ class LocalAgentConnector:
                 await self._update_capacity_status()
             self.current_game_id = game_id
             self.current_request_id = message.get("requestId")  # Track request ID for response routing
+            await self.stop_pondering()
 
             print(f"\n[Game {self.current_game_id}] Move request received")
             print(f"  Playing as: {message.get('player', 'unknown')}")
@@ -478,6 +512,7 @@ class LocalAgentConnector:
 
                     print(f"  ✓ Move sent: {type(piece).__name__} ({piece.position.x},{piece.position.y}) -> ({move.position.x},{move.position.y})")
                     print(f"  Time: {elapsed:.3f}s")
+                    self.start_pondering(player)
                 else:
                     raise Exception("Agent returned invalid move")
 
@@ -521,6 +556,8 @@ class LocalAgentConnector:
                         self.primary_game_id = game_id
                     await self._update_capacity_status()
             elif msg_type == "game_end":
+                await self.stop_pondering()
+                await self.end_game()
                 game_id = message.get('gameId')
                 result = message.get('result')
                 print(f"\n[Game {game_id}] Game ended")
@@ -1,355 +1,1647 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from array import array
+from itertools import cycle, product
 from math import inf
-from random import getrandbits
-from typing import Any, Iterable
-from chessmaker.chess.base import Board, Player, Piece, MoveOption, Position
-from chessmaker.chess.pieces import King
-from extension.board_rules import get_result
+from typing import Any, Callable, Iterator
+from random import Random
+from time import perf_counter
+from multiprocessing.shared_memory import SharedMemory
+import atexit
+import hashlib
+import mmap
+import multiprocessing
+import os
+import queue
+import struct
+import sys
+import threading
+import tracemalloc
+from chessmaker.chess.base import Board, Player, Piece, MoveOption, Position, Square
+from chessmaker.chess.pieces import King, Queen, Knight, Bishop
+from extension.piece_right import Right
+from extension.piece_pawn import Pawn_Q
+from extension.board_rules import THINKING_TIME_BUDGET
 from samples import white, black
 
+# board geometry, squares are indexed y * 5 + x with bit `1 << square`
+BOARD_SIZE = 5
+NUM_SQUARES = BOARD_SIZE * BOARD_SIZE
+ALL_SQUARES = (1 << NUM_SQUARES) - 1
+
+# piece types and colours, a piece code is colour * 6 + piece type
+KING, QUEEN, RIGHT, KNIGHT, BISHOP, PAWN = range(6)
+WHITE, BLACK = 0, 1
+EMPTY = -1
+PIECE_NAMES = ("king", "queen", "right", "knight", "bishop", "pawn")
+PIECE_LETTERS = "KQRNBP"
+COLOUR_NAMES = ("white", "black")
+PIECE_CLASSES = (King, Queen, Right, Knight, Bishop, Pawn_Q)
+
+# pawns of white move towards y = 0, pawns of black towards y = 4
+PAWN_STEP = (-BOARD_SIZE, BOARD_SIZE)
+PROMOTION_RANK = (0, BOARD_SIZE - 1)
+# rank a pawn stands on until it first moves, in front of its own back rank
+PAWN_START_RANK = (BOARD_SIZE - 2, 1)
+
+# moves are encoded as from | to << 5 | flags
+PROMOTION = 1 << 10
+EN_PASSANT = 1 << 11
+DOUBLE_PUSH = 1 << 12
+
+KING_OFFSETS = ((1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1), (0, 1))
+KNIGHT_OFFSETS = ((1, 2), (2, 1), (-1, 2), (-2, 1), (1, -2), (2, -1), (-1, -2), (-2, -1))
+
+# iterative deepening limits
+MAX_SEARCH_DEPTH = 64
+# share of the thinking budget one move may use, leaving slack for the game clock
+MOVE_TIME_RATIO = 0.6
+# no new iteration is started once this share of the move time has been used
+SOFT_TIME_RATIO = 0.5
+# the clock is only read every this many nodes, must be a power of two
+TIME_CHECK_INTERVAL = 1024
+
+# width of the zero window used by principal variation search
+NULL_WINDOW = 1e-6
+
+# helper processes of the lazy SMP search, 0 searches in this process only
+SMP_WORKERS = 0
+# seconds given to helpers to finish once stopped before they are killed
+SMP_JOIN_TIMEOUT = 0.5
+
+# threads of the lazy SMP search, only used on free-threaded builds
+SMP_THREADS = os.cpu_count() or 1
+# locks guarding the transposition table while threads share it, power of two
+TT_LOCK_STRIPES = 64
+
+# opening book written by build_opening_book and probed before each search
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+# plies from each starting layout the book covers
+BOOK_PLIES = 4
+
+# zobrist keys are drawn from this seed so hashes agree between runs and
+# processes, which the transposition table files rely on, None draws them
+# afresh each run
+ZOBRIST_SEED: int | None = 0x5A0B1157
+# zobrist key list layout, a key per piece code and square at
+# code * NUM_SQUARES + square followed by a key per side to move
+ZOBRIST_TURN = 12 * NUM_SQUARES
+ZOBRIST_KEYS = ZOBRIST_TURN + 2
+
+# endgame tablebases written by build_tablebases, probed at this many pieces or fewer
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+TABLEBASE_PIECES = 4
+
+# transposition table size per agent and bound flags of its entries
+TT_SIZE_MB = 16
+# file the table of each agent is loaded from on first use and flushed to by
+# end_game, {colour} is filled in or else the colour is added to the file
+# name, None keeps the tables in memory only
+TT_FILE = os.environ.get("TT_FILE") or None
+EXACT, LOWER, UPPER = 1, 2, 3
+
+
+def free_threaded() -> bool:
+    """return true if threads of this interpreter run in parallel,
+    a free-threaded build (3.13t) with the GIL switched off"""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def colour_of(player: Player | str) -> int:
+    """return colour index of a chessmaker player or player name"""
+    name = player.name if isinstance(player, Player) else player
+    return WHITE if name.lower() == "white" else BLACK
+
+
+def iter_squares(bitboard: int):
+    """yield square index of every set bit in `bitboard`, lowest first"""
+    while bitboard:
+        low = bitboard & -bitboard
+        yield low.bit_length() - 1
+        bitboard ^= low
+
+
+def _step_targets(square: int, offsets: tuple[tuple[int, int], ...]) -> int:
+    """mask of squares reached by single jumps of `offsets` from `square`"""
+    x, y = square % BOARD_SIZE, square // BOARD_SIZE
+    mask = 0
+    for dx, dy in offsets:
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < BOARD_SIZE and 0 <= ny < BOARD_SIZE:
+            mask |= 1 << (ny * BOARD_SIZE + nx)
+    return mask
+
+
+def _slide_targets(
+    square: int, directions: tuple[tuple[int, int], ...], occupied: int
+) -> int:
+    """mask of squares reached sliding in `directions` until blocked, blockers included"""
+    x, y = square % BOARD_SIZE, square // BOARD_SIZE
+    mask = 0
+    for dx, dy in directions:
+        nx, ny = x + dx, y + dy
+        while 0 <= nx < BOARD_SIZE and 0 <= ny < BOARD_SIZE:
+            bit = 1 << (ny * BOARD_SIZE + nx)
+            mask |= bit
+            if occupied & bit:
+                break
+            nx += dx
+            ny += dy
+    return mask
+
+
+def _line_table(square: int, direction: tuple[int, int]) -> tuple[int, dict[int, int]]:
+    """
+    tabulate sliding attacks of `square` along one line, both ways
+
+    :param square: square the slider stands on
+    :type square: int
+    :param direction: one of the two directions making up the line
+    :type direction: tuple[int, int]
+    :return: mask of the other squares on the line and a table from
+        occupancy of that mask to attacked squares
+    :rtype: tuple[int, dict[int, int]]
+    """
+    directions = (direction, (-direction[0], -direction[1]))
+    mask = _slide_targets(square, directions, 0)
+    table: dict[int, int] = {}
+    subset = 0
+    while True:
+        # walk every subset of the line mask (carry rippler)
+        table[subset] = _slide_targets(square, directions, subset)
+        subset = (subset - mask) & mask
+        if subset == 0:
+            return mask, table
+
+
+# precomputed attack tables, indexed by square (and colour for pawns)
+KING_ATTACKS = tuple(_step_targets(sq, KING_OFFSETS) for sq in range(NUM_SQUARES))
+KNIGHT_ATTACKS = tuple(_step_targets(sq, KNIGHT_OFFSETS) for sq in range(NUM_SQUARES))
+PAWN_ATTACKS = tuple(
+    tuple(
+        _step_targets(sq, ((1, step // BOARD_SIZE), (-1, step // BOARD_SIZE)))
+        for sq in range(NUM_SQUARES)
+    )
+    for step in PAWN_STEP
+)
+# sliding lines per square as (mask, table, mask, table)
+ROOK_LINES = tuple(
+    _line_table(sq, (1, 0)) + _line_table(sq, (0, 1)) for sq in range(NUM_SQUARES)
+)
+BISHOP_LINES = tuple(
+    _line_table(sq, (1, 1)) + _line_table(sq, (1, -1)) for sq in range(NUM_SQUARES)
+)
+
+
+def _between(a: int, b: int) -> int:
+    """mask of squares strictly between `a` and `b` if they share a line, else 0"""
+    ax, ay, bx, by = a % BOARD_SIZE, a // BOARD_SIZE, b % BOARD_SIZE, b // BOARD_SIZE
+    dx, dy = bx - ax, by - ay
+    if a == b or not (dx == 0 or dy == 0 or abs(dx) == abs(dy)):
+        return 0
+    step_x, step_y = (dx > 0) - (dx < 0), (dy > 0) - (dy < 0)
+    mask = 0
+    x, y = ax + step_x, ay + step_y
+    while (x, y) != (bx, by):
+        mask |= 1 << (y * BOARD_SIZE + x)
+        x += step_x
+        y += step_y
+    return mask
+
+
+BETWEEN = tuple(
+    tuple(_between(a, b) for b in range(NUM_SQUARES)) for a in range(NUM_SQUARES)
+)
+
+# square seen from the other side, the board flipped top to bottom
+MIRROR = tuple(
+    (BOARD_SIZE - 1 - sq // BOARD_SIZE) * BOARD_SIZE + sq % BOARD_SIZE
+    for sq in range(NUM_SQUARES)
+)
+
+
+def rook_attacks(square: int, occupied: int) -> int:
+    """mask of squares attacked along ranks and files from `square`"""
+    mask_a, table_a, mask_b, table_b = ROOK_LINES[square]
+    return table_a[occupied & mask_a] | table_b[occupied & mask_b]
+
+
+def bishop_attacks(square: int, occupied: int) -> int:
+    """mask of squares attacked along diagonals from `square`"""
+    mask_a, table_a, mask_b, table_b = BISHOP_LINES[square]
+    return table_a[occupied & mask_a] | table_b[occupied & mask_b]
+
+
+def attacks_from(piece_type: int, colour: int, square: int, occupied: int) -> int:
+    """
+    returns mask of squares a piece attacks from `square`
+
+    :param piece_type: type of piece attacking
+    :type piece_type: int
+    :param colour: colour of the attacking piece, only matters for pawns
+    :type colour: int
+    :param square: square the piece stands on
+    :type square: int
+    :param occupied: mask of every occupied square, blocks sliding pieces
+    :type occupied: int
+    :return: mask of attacked squares, including squares of own pieces
+    :rtype: int
+    """
+    if piece_type == PAWN:
+        return PAWN_ATTACKS[colour][square]
+    if piece_type == KNIGHT:
+        return KNIGHT_ATTACKS[square]
+    if piece_type == RIGHT:
+        return KNIGHT_ATTACKS[square] | rook_attacks(square, occupied)
+    if piece_type == BISHOP:
+        return bishop_attacks(square, occupied)
+    if piece_type == QUEEN:
+        return rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+    return KING_ATTACKS[square]
+
+
+class BitBoard:
+    """
+    compact game state, one 25 bit integer per piece type and colour,
+    plus side to move, pawn double step rights and en passant square,
+    running per colour sums of the evaluation terms that only depend
+    on where each piece stands, and per colour attack counts of every square
+    """
 
-@dataclass(frozen=False)
-class TTEntry:
-    """holds a depth score and flag representing node"""
+    _z_keys: list[int] = []
+    # debug mode, cross check every legal move list against chessmaker
+    check_legal_moves: bool = False
+    __slots__ = (
+        "pieces",
+        "occupancy",
+        "mailbox",
+        "turn",
+        "unmoved_pawns",
+        "ep_square",
+        "z_hash",
+        "material",
+        "centre",
+        "advance",
+        "attack_sets",
+        "attack_counts",
+        "attack_masks",
+        "attacks_pending",
+    )
 
-    depth: int
-    score: float
-    flag: str  # exact, lower, upper
+    def __init__(self) -> None:
+        """initialise an empty board with white to move"""
+        if not BitBoard._z_keys:
+            BitBoard._initialise_zobrist_keys()
+        self.pieces: list[int] = [0] * 12
+        self.occupancy: list[int] = [0, 0]
+        self.mailbox: list[int] = [EMPTY] * NUM_SQUARES
+        self.turn: int = WHITE
+        self.unmoved_pawns: int = 0
+        self.ep_square: int = EMPTY
+        self.z_hash: int = 0
+        # per colour sums kept up to date by _put and _remove
+        self.material: list[float] = [0.0, 0.0]
+        self.centre: list[float] = [0.0, 0.0]
+        self.advance: list[float] = [0.0, 0.0]
+        # per colour, squares attacked by the piece on each square, how many
+        # pieces attack each square and the mask of squares attacked at all,
+        # make_move and unmake_move only mark the squares they touched and the
+        # maps catch up on the next read, so make/unmake pairs that never look
+        # at attacks (hashing children, en passant tests) cost nothing
+        self.attack_sets: list[list[int]] = [[0] * NUM_SQUARES, [0] * NUM_SQUARES]
+        self.attack_counts: list[list[int]] = [[0] * NUM_SQUARES, [0] * NUM_SQUARES]
+        self.attack_masks: list[int] = [0, 0]
+        self.attacks_pending: int = 0
 
+    @classmethod
+    def from_board(cls, board: Board) -> "BitBoard":
+        """
+        convert a chessmaker board into a compact board
 
-class Node:
+        :param board: board to convert
+        :type board: Board
+        :return: compact board holding the same game state
+        :rtype: BitBoard
+        """
+        bb = cls()
+        for pc in board.get_pieces():
+            colour = colour_of(pc.player)
+            square = pc.position.y * BOARD_SIZE + pc.position.x
+            bb._put(colour * 6 + PIECE_NAMES.index(pc.name.lower()), square)
+            if pc.name.lower() != "pawn":
+                continue
+            moved_turns_ago = getattr(pc, "_moved_turns_ago", -1)
+            if moved_turns_ago == -1:
+                bb.unmoved_pawns |= 1 << square
+            last = getattr(pc, "_last_position", None)
+            if (
+                0 <= moved_turns_ago <= 1
+                and last is not None
+                and last.x == pc.position.x
+                and abs(last.y - pc.position.y) == 2
+            ):
+                bb.ep_square = (last.y + pc.position.y) // 2 * BOARD_SIZE + last.x
+        bb.turn = colour_of(board.current_player)
+        bb.z_hash = bb._calc_root_hash()
+        bb.attacks_pending = ALL_SQUARES
+        return bb
+
+    def to_board(self) -> Board:
+        """
+        convert this compact board back into a chessmaker board
+
+        :return: new chessmaker board holding this game state
+        :rtype: Board
+        """
+        players = [white, black]
+        squares = [[Square() for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+        for square in iter_squares(self.occupancy[WHITE] | self.occupancy[BLACK]):
+            code = self.mailbox[square]
+            x, y = square % BOARD_SIZE, square // BOARD_SIZE
+            pc = PIECE_CLASSES[code % 6](players[code // 6])
+            if code % 6 == PAWN and not self.unmoved_pawns & (1 << square):
+                pc._moved_turns_ago = 2
+                if self.ep_square != EMPTY and square == self.ep_square - PAWN_STEP[
+                    self.turn
+                ]:
+                    pc._moved_turns_ago = 1
+                    last = self.ep_square + PAWN_STEP[self.turn]
+                    pc._last_position = Position(last % BOARD_SIZE, last // BOARD_SIZE)
+            squares[y][x] = Square(pc)
+        turn_iterator = cycle(players)
+        if self.turn == BLACK:
+            next(turn_iterator)
+        return Board(squares=squares, players=players, turn_iterator=turn_iterator)
+
+    @staticmethod
+    def to_move_option(
+        board: Board, move: int
+    ) -> tuple[Piece, MoveOption] | tuple[None, None]:
+        """
+        find the chessmaker piece and move option matching an encoded move
+
+        :param board: chessmaker board the move is played on
+        :type board: Board
+        :param move: encoded move
+        :type move: int
+        :return: matching piece and move option or Nones if not found
+        :rtype: tuple[Piece, MoveOption] | tuple[None, None]
+        """
+        frm, to = move & 31, (move >> 5) & 31
+        square = board[Position(frm % BOARD_SIZE, frm // BOARD_SIZE)]
+        if square is None or square.piece is None:
+            return None, None
+        target = Position(to % BOARD_SIZE, to // BOARD_SIZE)
+        for mv in square.piece.get_move_options():
+            if mv.position == target:
+                return square.piece, mv
+        return None, None
+
+    @staticmethod
+    def from_move_option(piece: Piece, move_opt: MoveOption) -> int:
+        """
+        encode a chessmaker piece and move option as a move
+
+        :param piece: piece making the move
+        :type piece: Piece
+        :param move_opt: move option of the piece
+        :type move_opt: MoveOption
+        :return: encoded move
+        :rtype: int
+        """
+        frm = piece.position.y * BOARD_SIZE + piece.position.x
+        to = move_opt.position.y * BOARD_SIZE + move_opt.position.x
+        move = frm | to << 5
+        if "promote" in move_opt.extra:
+            move |= PROMOTION
+        if "en_passant" in move_opt.extra:
+            move |= EN_PASSANT
+        if piece.name.lower() == "pawn" and abs(to - frm) == 2 * BOARD_SIZE:
+            move |= DOUBLE_PUSH
+        return move
+
+    def copy(self) -> "BitBoard":
+        """return independent copy of this board"""
+        bb = BitBoard.__new__(BitBoard)
+        bb.pieces = self.pieces[:]
+        bb.occupancy = self.occupancy[:]
+        bb.mailbox = self.mailbox[:]
+        bb.turn = self.turn
+        bb.unmoved_pawns = self.unmoved_pawns
+        bb.ep_square = self.ep_square
+        bb.z_hash = self.z_hash
+        bb.material = self.material[:]
+        bb.centre = self.centre[:]
+        bb.advance = self.advance[:]
+        bb.attack_sets = [self.attack_sets[WHITE][:], self.attack_sets[BLACK][:]]
+        bb.attack_counts = [
+            self.attack_counts[WHITE][:],
+            self.attack_counts[BLACK][:],
+        ]
+        bb.attack_masks = self.attack_masks[:]
+        bb.attacks_pending = self.attacks_pending
+        return bb
+
+    def _put(self, code: int, square: int) -> None:
+        """place piece `code` on an empty square without touching the hash"""
+        bit = 1 << square
+        colour = code // 6
+        self.pieces[code] |= bit
+        self.occupancy[colour] |= bit
+        self.mailbox[square] = code
+        index = code * NUM_SQUARES + square
+        self.material[colour] += PSQ_MATERIAL[index]
+        self.centre[colour] += PSQ_CENTRE[index]
+        self.advance[colour] += PSQ_ADVANCE[index]
+
+    def _remove(self, square: int) -> int:
+        """remove and return piece on `square` without touching the hash"""
+        code = self.mailbox[square]
+        bit = 1 << square
+        colour = code // 6
+        self.pieces[code] ^= bit
+        self.occupancy[colour] ^= bit
+        self.mailbox[square] = EMPTY
+        index = code * NUM_SQUARES + square
+        self.material[colour] -= PSQ_MATERIAL[index]
+        self.centre[colour] -= PSQ_CENTRE[index]
+        self.advance[colour] -= PSQ_ADVANCE[index]
+        return code
+
+    def king_square(self, colour: int) -> int:
+        """return square of the king of `colour`, EMPTY if it has no king"""
+        kings = self.pieces[colour * 6 + KING]
+        return kings.bit_length() - 1 if kings else EMPTY
+
+    def only_kings(self) -> bool:
+        """return true if nothing but the two kings is left"""
+        occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+        return occupied == self.pieces[KING] | self.pieces[6 + KING]
+
+    def attacks_by(self, colour: int) -> int:
+        """return mask of every square attacked by pieces of `colour`"""
+        if self.attacks_pending:
+            self._update_attacks()
+        return self.attack_masks[colour]
+
+    def attack_count(self, colour: int, square: int) -> int:
+        """return how many pieces of `colour` attack `square`"""
+        if self.attacks_pending:
+            self._update_attacks()
+        return self.attack_counts[colour][square]
+
+    def piece_attacks(self, square: int) -> int:
+        """return mask of squares attacked by the piece on `square`"""
+        if self.attacks_pending:
+            self._update_attacks()
+        code = self.mailbox[square]
+        return self.attack_sets[code // 6][square] if code != EMPTY else 0
+
+    def _update_attacks(self) -> None:
+        """
+        bring the attack maps up to date with the squares in `attacks_pending`,
+        only the pieces on those squares and the sliders whose rays reached
+        them are regenerated, pending squares of several moves can be applied
+        at once since a ray only changes where a square on it changed
+        """
+        changed = self.attacks_pending
+        self.attacks_pending = 0
+        occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+        pieces = self.pieces
+        mailbox = self.mailbox
+        sliders = (
+            pieces[QUEEN]
+            | pieces[RIGHT]
+            | pieces[BISHOP]
+            | pieces[6 + QUEEN]
+            | pieces[6 + RIGHT]
+            | pieces[6 + BISHOP]
+        ) & ~changed
+        for colour in (WHITE, BLACK):
+            sets = self.attack_sets[colour]
+            counts = self.attack_counts[colour]
+            mask = self.attack_masks[colour]
+            for square in iter_squares(changed | sliders & self.occupancy[colour]):
+                old = sets[square]
+                if not changed & (1 << square | old):
+                    continue
+                code = mailbox[square]
+                if code != EMPTY and code // 6 == colour:
+                    new = attacks_from(code % 6, colour, square, occupied)
+                else:
+                    new = 0
+                if new == old:
+                    continue
+                sets[square] = new
+                # bits are walked inline, this loop runs for most moves searched
+                lost = old & ~new
+                while lost:
+                    low = lost & -lost
+                    lost ^= low
+                    target = low.bit_length() - 1
+                    counts[target] -= 1
+                    if not counts[target]:
+                        mask ^= low
+                gained = new & ~old
+                while gained:
+                    low = gained & -gained
+                    gained ^= low
+                    target = low.bit_length() - 1
+                    counts[target] += 1
+                    mask |= low
+            self.attack_masks[colour] = mask
+
+    def attackers_of(self, square: int, by: int, occupied: int | None = None) -> int:
+        """
+        returns mask of pieces of colour `by` attacking `square`
+
+        :param square: square being attacked
+        :type square: int
+        :param by: colour of the attacking pieces
+        :type by: int
+        :param occupied: occupancy blocking sliders, defaults to the board
+        :type occupied: int | None
+        :return: mask of the attacking pieces
+        :rtype: int
+        """
+        pieces = self.pieces
+        base = by * 6
+        if occupied is None:
+            occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+        return (
+            KNIGHT_ATTACKS[square] & (pieces[base + KNIGHT] | pieces[base + RIGHT])
+            | KING_ATTACKS[square] & pieces[base + KING]
+            | PAWN_ATTACKS[by ^ 1][square] & pieces[base + PAWN]
+            | bishop_attacks(square, occupied)
+            & (pieces[base + BISHOP] | pieces[base + QUEEN])
+            | rook_attacks(square, occupied)
+            & (pieces[base + RIGHT] | pieces[base + QUEEN])
+        )
+
+    def see(self, move: int) -> float:
+        """
+        static exchange evaluation, material won by `move` for the side to
+        move once both sides keep recapturing on its target square with their
+        least valuable attacker, either side may stop when that is better,
+        pins are ignored
+
+        x-ray attackers join as the pieces in front of them are used up,
+        a Right attacks like a knight and a rook at once and pawns reaching
+        the last rank are valued as the queen they promote to
+
+        :param move: encoded legal move of side to move
+        :type move: int
+        :return: material balance of the exchange, in SEE_VALUES
+        :rtype: float
+        """
+        frm, to = move & 31, (move >> 5) & 31
+        us = self.turn
+        pieces = self.pieces
+        occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+        if move & EN_PASSANT:
+            occupied ^= 1 << (to - PAWN_STEP[us])
+            gain = SEE_VALUES[PAWN]
+        elif self.mailbox[to] != EMPTY:
+            gain = SEE_VALUES[self.mailbox[to] % 6]
+        else:
+            gain = 0.0
+        on_square = self.mailbox[frm] % 6
+        if move & PROMOTION:
+            gain += SEE_VALUES[QUEEN] - SEE_VALUES[PAWN]
+            on_square = QUEEN
+        gains = [gain]
+        occupied ^= 1 << frm
+        side = us ^ 1
+        while True:
+            attackers = self.attackers_of(to, side, occupied) & occupied
+            if not attackers:
+                break
+            base = side * 6
+            for piece_type in SEE_ORDER:
+                candidates = attackers & pieces[base + piece_type]
+                if candidates:
+                    break
+            gain = SEE_VALUES[on_square] - gains[-1]
+            on_square = piece_type
+            if piece_type == PAWN and to // BOARD_SIZE == PROMOTION_RANK[side]:
+                gain += SEE_VALUES[QUEEN] - SEE_VALUES[PAWN]
+                on_square = QUEEN
+            gains.append(gain)
+            occupied ^= candidates & -candidates
+            side ^= 1
+        # each side only continues the exchange while it does not lose by it
+        for i in range(len(gains) - 1, 0, -1):
+            gains[i - 1] = -max(-gains[i - 1], gains[i])
+        return gains[0]
+
+    def king_trapped(self, colour: int) -> bool:
+        """
+        return true if the king of `colour` has no square to step to, every
+        neighbouring square is held by its own pieces or attacked, sliders
+        seeing through the square the king leaves
+
+        :param colour: colour of the king
+        :type colour: int
+        :return: whether the king has no move
+        :rtype: bool
+        """
+        square = self.king_square(colour)
+        if square == EMPTY:
+            return False
+        occupied = (self.occupancy[WHITE] | self.occupancy[BLACK]) ^ 1 << square
+        for target in iter_squares(KING_ATTACKS[square] & ~self.occupancy[colour]):
+            if not self.attackers_of(target, colour ^ 1, occupied):
+                return False
+        return True
+
+    def in_check(self, colour: int) -> bool:
+        """return true if the king of `colour` is attacked"""
+        return bool(self.pieces[colour * 6 + KING] & self.attacks_by(colour ^ 1))
+
+    def gives_check(self, move: int) -> bool:
+        """
+        return true if `move` would attack the enemy king, looked up from
+        the attack tables without playing the move
+
+        :param move: encoded legal move of side to move
+        :type move: int
+        :return: true if the move checks directly or by discovery
+        :rtype: bool
+        """
+        us = self.turn
+        king = self.king_square(us ^ 1)
+        if king == EMPTY:
+            return False
+        frm, to = move & 31, (move >> 5) & 31
+        piece_type = QUEEN if move & PROMOTION else self.mailbox[frm] % 6
+        from_bit = 1 << frm
+        occupied = (self.occupancy[WHITE] | self.occupancy[BLACK]) ^ from_bit | 1 << to
+        if move & EN_PASSANT:
+            occupied ^= 1 << (to - PAWN_STEP[us])
+        if attacks_from(piece_type, us, to, occupied) & (1 << king):
+            return True
+        # discovered attacks by own sliders behind the vacated square
+        pieces = self.pieces
+        base = us * 6
+        diagonal = (pieces[base + BISHOP] | pieces[base + QUEEN]) & ~from_bit
+        straight = (pieces[base + RIGHT] | pieces[base + QUEEN]) & ~from_bit
+        return bool(
+            bishop_attacks(king, occupied) & diagonal
+            or rook_attacks(king, occupied) & straight
+        )
+
+    def pseudo_legal_moves(self) -> list[int]:
+        """return moves of side to move ignoring whether own king is left attacked"""
+        us = self.turn
+        own = self.occupancy[us]
+        enemy = self.occupancy[us ^ 1]
+        occupied = own | enemy
+        mailbox = self.mailbox
+        moves: list[int] = []
+        for frm in iter_squares(own):
+            piece_type = mailbox[frm] % 6
+            if piece_type == PAWN:
+                self._pawn_moves(frm, occupied, enemy, moves)
+                continue
+            targets = attacks_from(piece_type, us, frm, occupied) & ~own
+            for to in iter_squares(targets):
+                moves.append(frm | to << 5)
+        return moves
+
+    def _pawn_moves(self, frm: int, occupied: int, enemy: int, moves: list[int]) -> None:
+        """append pushes, captures, en passant and promotions of pawn on `frm`"""
+        us = self.turn
+        step = PAWN_STEP[us]
+        last_rank = PROMOTION_RANK[us]
+        one = frm + step
+        if 0 <= one < NUM_SQUARES and not occupied & (1 << one):
+            moves.append(frm | one << 5 | (PROMOTION if one // 5 == last_rank else 0))
+            two = one + step
+            if (
+                self.unmoved_pawns & (1 << frm)
+                and 0 <= two < NUM_SQUARES
+                and not occupied & (1 << two)
+            ):
+                flags = DOUBLE_PUSH | (PROMOTION if two // 5 == last_rank else 0)
+                moves.append(frm | two << 5 | flags)
+        captures = PAWN_ATTACKS[us][frm]
+        for to in iter_squares(captures & enemy):
+            moves.append(frm | to << 5 | (PROMOTION if to // 5 == last_rank else 0))
+        if self.ep_square != EMPTY and captures & (1 << self.ep_square):
+            moves.append(frm | self.ep_square << 5 | EN_PASSANT)
+
+    def legal_moves(self) -> list[int]:
+        """
+        return moves of side to move that do not leave own king attacked,
+        checkers and pinned pieces are found once and pseudo legal moves
+        are filtered against them
+
+        :return: encoded legal moves
+        :rtype: list[int]
+        """
+        us = self.turn
+        them = us ^ 1
+        king = self.king_square(us)
+        if king == EMPTY:
+            return self.pseudo_legal_moves()
+        own = self.occupancy[us]
+        enemy = self.occupancy[them]
+        occupied = own | enemy
+        pieces = self.pieces
+        mailbox = self.mailbox
+        king_bit = 1 << king
+        moves: list[int] = []
+
+        # king steps, sliders must see through the square the king leaves
+        without_king = occupied ^ king_bit
+        for to in iter_squares(KING_ATTACKS[king] & ~own):
+            if not self.attackers_of(to, them, without_king):
+                moves.append(king | to << 5)
+
+        checkers = self.attackers_of(king, them, occupied)
+        if checkers & (checkers - 1):
+            # double check, only the king can move
+            return moves
+        target = ALL_SQUARES
+        if checkers:
+            target = checkers | BETWEEN[king][checkers.bit_length() - 1]
+
+        # own pieces between the king and an enemy slider are pinned to that line
+        pins: dict[int, int] = {}
+        base = them * 6
+        straight = pieces[base + RIGHT] | pieces[base + QUEEN]
+        diagonal = pieces[base + BISHOP] | pieces[base + QUEEN]
+        snipers = rook_attacks(king, enemy) & straight | bishop_attacks(
+            king, enemy
+        ) & diagonal
+        for sniper in iter_squares(snipers):
+            between = BETWEEN[king][sniper]
+            blockers = between & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pins[blockers.bit_length() - 1] = between | 1 << sniper
+
+        for frm in iter_squares(own ^ king_bit):
+            piece_type = mailbox[frm] % 6
+            allowed = target & pins.get(frm, ALL_SQUARES)
+            if piece_type == PAWN:
+                pawn_moves: list[int] = []
+                self._pawn_moves(frm, occupied, enemy, pawn_moves)
+                for move in pawn_moves:
+                    if move & EN_PASSANT:
+                        # captured pawn leaves its square too, test by playing it
+                        undo = self.make_move(move)
+                        if not self.in_check(us):
+                            moves.append(move)
+                        self.unmake_move(undo)
+                    elif allowed & (1 << ((move >> 5) & 31)):
+                        moves.append(move)
+                continue
+            targets = attacks_from(piece_type, us, frm, occupied) & ~own & allowed
+            for to in iter_squares(targets):
+                moves.append(frm | to << 5)
+
+        if BitBoard.check_legal_moves:
+            self._verify_legal_moves(moves)
+        return moves
+
+    def _legal_moves_by_clone(self) -> list[int]:
+        """reference generator, chessmaker clones the board to test every move"""
+        board = self.to_board()
+        return [
+            BitBoard.from_move_option(pc, mv)
+            for pc in board.get_player_pieces(board.current_player)
+            for mv in pc.get_move_options()
+        ]
+
+    def _verify_legal_moves(self, moves: list[int]) -> None:
+        """
+        cross check `moves` against the clone based chessmaker generator
+
+        :param moves: legal moves generated for this board
+        :type moves: list[int]
+        :raises RuntimeError: if the two generators disagree
+        """
+        expected = set(self._legal_moves_by_clone())
+        if expected != set(moves):
+            raise RuntimeError(
+                "legal move mismatch, missing "
+                f"{sorted(expected.difference(moves))} "
+                f"extra {sorted(set(moves).difference(expected))}"
+            )
+
+    def make_move(self, move: int) -> tuple[int, int, int, int, int, int]:
+        """
+        play `move` for side to move on this board in place, updating the hash
+
+        :param move: encoded move to play
+        :type move: int
+        :return: undo record (move, captured piece code, captured square,
+            previous unmoved pawns, previous en passant square, hash delta)
+            to hand back to `unmake_move`
+        :rtype: tuple[int, int, int, int, int, int]
+        """
+        z_keys = BitBoard._z_keys
+        frm, to = move & 31, (move >> 5) & 31
+        us = self.turn
+        prev_unmoved = self.unmoved_pawns
+        prev_ep = self.ep_square
+        z_delta = 0
+        captured_square = to - PAWN_STEP[us] if move & EN_PASSANT else to
+        captured = self.mailbox[captured_square]
+        if captured != EMPTY:
+            self._remove(captured_square)
+            self.unmoved_pawns &= ~(1 << captured_square)
+            z_delta ^= z_keys[captured * NUM_SQUARES + captured_square]
+        code = self._remove(frm)
+        z_delta ^= z_keys[code * NUM_SQUARES + frm]
+        if move & PROMOTION:
+            code = us * 6 + QUEEN
+        self._put(code, to)
+        z_delta ^= z_keys[code * NUM_SQUARES + to]
+        self.unmoved_pawns &= ~(1 << frm)
+        self.ep_square = (
+            frm + PAWN_STEP[us] if move & DOUBLE_PUSH and not move & PROMOTION else EMPTY
+        )
+        z_delta ^= z_keys[ZOBRIST_TURN] ^ z_keys[ZOBRIST_TURN + 1]
+        self.turn = us ^ 1
+        self.z_hash ^= z_delta
+        self.attacks_pending |= 1 << frm | 1 << to | 1 << captured_square
+        return move, captured, captured_square, prev_unmoved, prev_ep, z_delta
+
+    def unmake_move(self, undo: tuple[int, int, int, int, int, int]) -> None:
+        """
+        take back the move recorded in `undo`, restoring the exact previous state
+
+        :param undo: record returned by `make_move` for the last move played
+        :type undo: tuple[int, int, int, int, int, int]
+        """
+        move, captured, captured_square, prev_unmoved, prev_ep, z_delta = undo
+        frm, to = move & 31, (move >> 5) & 31
+        self.turn ^= 1
+        code = self._remove(to)
+        if move & PROMOTION:
+            code = self.turn * 6 + PAWN
+        self._put(code, frm)
+        if captured != EMPTY:
+            self._put(captured, captured_square)
+        self.unmoved_pawns = prev_unmoved
+        self.ep_square = prev_ep
+        self.z_hash ^= z_delta
+        self.attacks_pending |= 1 << frm | 1 << to | 1 << captured_square
+
+    def make_null_move(self) -> tuple[int, int]:
+        """
+        pass the turn to the other side without moving a piece
+
+        :return: undo record (previous en passant square, hash delta)
+            to hand back to `unmake_null_move`
+        :rtype: tuple[int, int]
+        """
+        z_keys = BitBoard._z_keys
+        prev_ep = self.ep_square
+        z_delta = z_keys[ZOBRIST_TURN] ^ z_keys[ZOBRIST_TURN + 1]
+        self.turn ^= 1
+        self.ep_square = EMPTY
+        self.z_hash ^= z_delta
+        return prev_ep, z_delta
+
+    def unmake_null_move(self, undo: tuple[int, int]) -> None:
+        """
+        take back the pass recorded in `undo`
+
+        :param undo: record returned by `make_null_move`
+        :type undo: tuple[int, int]
+        """
+        prev_ep, z_delta = undo
+        self.turn ^= 1
+        self.ep_square = prev_ep
+        self.z_hash ^= z_delta
+
+    @classmethod
+    def _initialise_zobrist_keys(cls, seed: int | None = ZOBRIST_SEED) -> None:
+        """
+        draw a distinct 64 bit key per piece code and square and per side
+        to move, laid out as ZOBRIST_TURN and ZOBRIST_KEYS describe
+
+        :param seed: equal seeds give equal keys in every process, None
+            draws different keys each run
+        :type seed: int | None
+        """
+        rng = Random(seed)
+        keys: list[int] = []
+        drawn: set[int] = set()
+        while len(keys) < ZOBRIST_KEYS:
+            key = rng.getrandbits(64)
+            if key not in drawn:
+                drawn.add(key)
+                keys.append(key)
+        cls._z_keys = keys
+
+    def position_key(self) -> int:
+        """
+        64 bit key of this position that is the same in every process
+        whatever ZOBRIST_SEED is, and unlike z_hash tells positions apart
+        by double step rights and en passant square
+
+        :return: key of pieces, side to move, double step rights and en
+            passant square
+        :rtype: int
+        """
+        packed = struct.pack(
+            "<12IBbI", *self.pieces, self.turn, self.ep_square, self.unmoved_pawns
+        )
+        return int.from_bytes(hashlib.blake2b(packed, digest_size=8).digest(), "little")
+
+    def _calc_root_hash(self) -> int:
+        """
+        calculate hash of this board from scratch
+
+        :return: returns hash representing game state
+        :rtype: int
+        """
+        z_keys = BitBoard._z_keys
+        z_hash = z_keys[ZOBRIST_TURN + self.turn]
+        for square in iter_squares(self.occupancy[WHITE] | self.occupancy[BLACK]):
+            z_hash ^= z_keys[self.mailbox[square] * NUM_SQUARES + square]
+        return z_hash
+
+
+class SearchTimeout(Exception):
+    """raised inside the search once the deadline has passed"""
+
+
+class TranspositionTable:
     """
-    holds information representing game state
+    fixed size transposition table held in two flat arrays,
+    buckets of two slots, the first kept for the deepest result and
+    the second always replaced, entries are verified with the upper
+    32 bits of the hash and aged by a generation counter per search
+
+    the arrays can live in shared memory so helper processes search into
+    the same table without locks, the check bits are stored folded with
+    the score so an entry torn by two processes writing at once reads
+    as a miss
     """
 
-    _z_keys: dict[str, int] = {}
-    _transposition_table: dict[int, TTEntry] = {}
+    # bytes per slot, one double for the score and one packed word
+    _SLOT_BYTES = 16
+    # packed word layout, depth | flag | generation | best move | check bits
+    _DEPTH_MASK = 0xFF
+    _FLAG_SHIFT = 8
+    _GENERATION_SHIFT = 10
+    _GENERATION_MASK = 0x3F
+    _MOVE_SHIFT = 16
+    _MOVE_MASK = 0xFFFF
+    _CHECK_SHIFT = 32
+    _CHECK_MASK = 0xFFFFFFFF
+    # table file header, magic, version, slots, generation and the colour
+    # of the agent whose scores it holds
+    _FILE_HEADER = struct.Struct("<8s16sQBB")
+    _FILE_MAGIC = b"5x5TTv02"
+    _tables: dict[int, "TranspositionTable"] = {}
     __slots__ = (
-        "board",
-        "current_player",
-        "previous_player",
-        "parents",
-        "children",
-        "move",
-        "z_hash",
-        "_cached_moves",
-        "kings",
-        "order_score",
-        "_attacked_by",
-        "_is_terminal",
+        "size_mb",
+        "n_buckets",
+        "_mask",
+        "_buffer",
+        "_scores",
+        "_score_bits",
+        "_data",
+        "_shm",
+        "_owner",
+        "generation",
     )
 
     def __init__(
-        self,
-        board: Board,
-        parent: "Node" | None = None,
-        move: tuple[Piece, MoveOption] | None = None,
-        z_hash: int | None = None,
+        self, size_mb: float = TT_SIZE_MB, shared: bool = False, name: str | None = None
     ) -> None:
         """
-        initialise a new node representing unique game state,
-        initialises Node zobrist keys class if first node created
-
-        :param self: this instance of a node
-        :param board: board object representing this node of game tree
-        :type board: Board
-        :param parent: node that led to this node, None for root
-        :type parent: 'Node' | None
-        :param move: move that led to this game state
-        :type move: tuple[Piece, MoveOption] | None
-        :param z_hash: zobrist hash belonging to this game state
-        :type z_hash: int | None
-        :rtype: None
+        allocate an empty table using at most `size_mb` megabytes
+
+        :param size_mb: memory cap of the table in megabytes
+        :type size_mb: float
+        :param shared: place the table in new shared memory
+        :type shared: bool
+        :param name: attach to the shared table of this name instead,
+            made by another process with the same `size_mb`
+        :type name: str | None
         """
-        if not Node._z_keys:
-            Node._initialise_zobrist_keys()
-        self.board: Board = board
-        self.current_player: Player = self.board.current_player
-        self.previous_player: Player = (
-            white if self.current_player.name.lower() == black.name.lower() else black
-        )
-        self.parents: list["Node"] = [] if parent is None else [parent]
-        self.children: list["Node"] = []
-        self.move: tuple[Piece, MoveOption] | None = move
-        self.order_score: float | None = None
-        self.z_hash: int = z_hash if z_hash is not None else Node._calc_root_hash(self)
-        self._cached_moves: list[tuple[Piece, MoveOption]] = []
-        self._attacked_by: dict[str, set[Position]] = {}
-        self._is_terminal: bool = False
-        if parent is None:
-            # find king on this board
-            self.kings = {}
-            for pc in self.board.get_pieces():
-                if isinstance(pc, King):
-                    self.kings[pc.player.name.lower()] = pc
+        slots = max(2, int(size_mb * 1024 * 1024) // self._SLOT_BYTES)
+        slots = 1 << (slots.bit_length() - 1)
+        size = slots * self._SLOT_BYTES
+        self._shm: SharedMemory | None = None
+        self._owner = name is None
+        if name is not None:
+            self._shm = SharedMemory(name=name)
+            buffer = self._shm.buf[:size]
+        elif shared:
+            self._shm = SharedMemory(create=True, size=size)
+            buffer = self._shm.buf[:size]
+            atexit.register(self.close)
         else:
-            # can use copy of parents kings and adjust if king move
-            self.kings = parent.kings.copy()
+            buffer = memoryview(bytearray(size))
+        self.size_mb = size_mb
+        self.n_buckets = slots // 2
+        self._mask = self.n_buckets - 1
+        self._buffer = buffer
+        self._scores = buffer[: slots * 8].cast("d")
+        self._score_bits = buffer[: slots * 8].cast("Q")
+        self._data = buffer[slots * 8 :].cast("Q")
+        self.generation = 0
+
+    @property
+    def name(self) -> str | None:
+        """name helper processes attach with, None if not in shared memory"""
+        return None if self._shm is None else self._shm.name
+
+    def close(self) -> None:
+        """let go of the shared memory, the process that made it also frees it"""
+        if self._shm is None:
+            return
+        for view in (self._scores, self._score_bits, self._data, self._buffer):
+            view.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+        self._shm = None
 
     @classmethod
-    def add_entry_in_tt(
-        cls, node: "Node", depth: int = 0, value: float = 0, flag: str = "Lower"
+    def for_colour(cls, colour: int, shared: bool = False) -> "TranspositionTable":
+        """
+        return the table of the agent playing `colour`, scores are in the
+        perspective of that agent so each side keeps its own table
+
+        :param colour: colour the agent plays
+        :type colour: int
+        :param shared: the table must be in shared memory, a private table
+            kept so far is replaced
+        :type shared: bool
+        :return: table kept across every search of that agent
+        :rtype: TranspositionTable
+        """
+        table = cls._tables.get(colour)
+        if table is None or shared and table.name is None:
+            table = cls._tables[colour] = cls(shared=shared)
+            if TT_FILE is not None:
+                table.load(cls.file_for(colour), colour)
+        return table
+
+    @staticmethod
+    def file_for(colour: int) -> str:
+        """
+        return the TT_FILE path of the agent playing `colour`, a name
+        without {colour} gets the colour appended, tt.bin becomes
+        tt_white.bin, so the two agents never share a file
+
+        :param colour: colour the agent plays
+        :type colour: int
+        :return: path of its table file
+        :rtype: str
+        """
+        name = COLOUR_NAMES[colour]
+        if "{colour}" in TT_FILE:
+            return TT_FILE.format(colour=name)
+        stem, ext = os.path.splitext(TT_FILE)
+        return f"{stem}_{name}{ext}"
+
+    @staticmethod
+    def file_version() -> bytes:
+        """
+        digest of what stored scores depend on, the evaluation weights and
+        the zobrist keys, files of another version are not loaded
+
+        :return: 16 byte version
+        :rtype: bytes
+        """
+        if not BitBoard._z_keys:
+            BitBoard._initialise_zobrist_keys()
+        weights = (
+            Search.MAP_PIECE_TO_VALUE,
+            Search.MAP_PIECE_CENTER_TO_VALUE,
+            sorted(Search.CENTRE_SQUARES),
+            Search.bonus,
+            Search.TABLEBASE_SCORE,
+        )
+        keys = BitBoard._z_keys
+        return hashlib.blake2b(repr((weights, keys)).encode(), digest_size=16).digest()
+
+    def load(self, path: str, colour: int) -> bool:
+        """
+        replace the contents of this table with the file at `path` written
+        by flush, the table is left empty if the file cannot be used
+
+        :param path: table file
+        :type path: str
+        :param colour: colour of the agent the table is for, scores are in
+            its perspective
+        :type colour: int
+        :return: false if there is no file or it is of another version,
+            size or colour
+        :rtype: bool
+        """
+        self.clear()
+        header = self._FILE_HEADER
+        try:
+            with open(path, "rb") as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return False
+        with mapped:
+            if len(mapped) != header.size + len(self._buffer):
+                return False
+            magic, version, slots, generation, owner = header.unpack_from(mapped)
+            if (
+                magic != self._FILE_MAGIC
+                or version != self.file_version()
+                or slots != self.n_buckets * 2
+                or owner != colour
+            ):
+                return False
+            self._buffer[:] = mapped[header.size :]
+        self.generation = generation
+        return True
+
+    def flush(self, path: str, colour: int) -> None:
+        """
+        write this table to `path`, replacing the file whole so a flush cut
+        short leaves the previous one intact
+
+        :param path: table file
+        :type path: str
+        :param colour: colour of the agent the table is for
+        :type colour: int
+        """
+        header = self._FILE_HEADER.pack(
+            self._FILE_MAGIC,
+            self.file_version(),
+            self.n_buckets * 2,
+            self.generation,
+            colour,
+        )
+        with open(path + ".tmp", "wb") as file:
+            file.write(header)
+            file.write(self._buffer)
+        os.replace(path + ".tmp", path)
+
+    def new_search(self) -> None:
+        """age the table, entries of earlier searches become preferred victims"""
+        self.generation = (self.generation + 1) & self._GENERATION_MASK
+
+    def clear(self) -> None:
+        """empty every slot, scores and packed words, and restart the generation"""
+        self._buffer[:] = bytes(len(self._buffer))
+        self.generation = 0
+
+    def probe(self, z_hash: int) -> tuple[int, float, int, int] | None:
+        """
+        take a nodes hash and find entry in TT
+
+        :param z_hash: hash representing the game state
+        :type z_hash: int
+        :return: depth, score, flag and best move (0 if none) of the entry,
+            None if not found
+        :rtype: tuple[int, float, int, int] | None
+        """
+        check = z_hash >> self._CHECK_SHIFT
+        slot = (z_hash & self._mask) << 1
+        data = self._data
+        score_bits = self._score_bits
+        for i in (slot, slot + 1):
+            word = data[i]
+            bits = score_bits[i]
+            folded = check ^ (bits ^ bits >> 32) & self._CHECK_MASK
+            if word >> self._CHECK_SHIFT == folded and word >> self._FLAG_SHIFT & 3:
+                return (
+                    word & self._DEPTH_MASK,
+                    self._scores[i],
+                    word >> self._FLAG_SHIFT & 3,
+                    word >> self._MOVE_SHIFT & self._MOVE_MASK,
+                )
+        return None
+
+    def store(
+        self, z_hash: int, depth: int, score: float, flag: int, move: int = 0
     ) -> None:
         """
         adds an entry for hash of game state into tt,
         validates flag to make sure correct
 
-        :param node: node whose game state we are saving
-        :type node: "Node"
+        :param z_hash: hash of the game state we are saving
+        :type z_hash: int
         :param depth: depth that this node was evaluated at
         :type depth: int
-        :param value: value this game state was given
-        :type value: float
-        :param flag: bound of value
-        :type flag: str
+        :param score: value this game state was given
+        :type score: float
+        :param flag: bound of value, EXACT, LOWER or UPPER
+        :type flag: int
+        :param move: encoded best move found, 0 if none
+        :type move: int
         """
-        if (flag_str := flag.upper()) not in ("LOWER", "UPPER", "EXACT"):
+        if flag not in (EXACT, LOWER, UPPER):
             raise ValueError("Flag must be exact lower or upper bound")
-        cls._transposition_table[node.z_hash] = TTEntry(
-            depth=depth, score=value, flag=flag_str
+        check = z_hash >> self._CHECK_SHIFT
+        slot = (z_hash & self._mask) << 1
+        data = self._data
+        score_bits = self._score_bits
+        word = data[slot]
+        bits = score_bits[slot]
+        # depth preferred slot takes the entry if it is the same position,
+        # empty, from an older search or not deeper, else always replace slot
+        if not (
+            word >> self._CHECK_SHIFT == check ^ (bits ^ bits >> 32) & self._CHECK_MASK
+            or not word >> self._FLAG_SHIFT & 3
+            or (word >> self._GENERATION_SHIFT) & self._GENERATION_MASK
+            != self.generation
+            or depth >= word & self._DEPTH_MASK
+        ):
+            slot += 1
+        self._scores[slot] = score
+        bits = score_bits[slot]
+        data[slot] = (
+            (check ^ (bits ^ bits >> 32) & self._CHECK_MASK) << self._CHECK_SHIFT
+            | move << self._MOVE_SHIFT
+            | self.generation << self._GENERATION_SHIFT
+            | flag << self._FLAG_SHIFT
+            | min(depth, self._DEPTH_MASK)
         )
 
-    @classmethod
-    def get_entry_in_tt(
-        cls, z_hash: int
-    ) -> tuple[int, float, str] | tuple[None, None, None]:
-        """
-        take a nodes hash and find entry in TT,
-        returns depth, score, flag
-        return tuple of None if not
 
-        :param cls: Node class
-        :param z_hash: hash representing the game state
-        :type z_hash: int
-        :return: return depth, score, flag as tuple or Nones if no entry
-        :rtype: tuple[int, float, str] | tuple[None, None, None]
+class StripedTable:
+    """
+    transposition table shared by the threads of one search, each bucket
+    is guarded by one of a fixed set of locks picked by its index so
+    threads only wait on each other when they touch the same stripe
+    """
+
+    __slots__ = ("table", "_locks", "_stripe_mask")
+
+    def __init__(self, table: TranspositionTable, stripes: int = TT_LOCK_STRIPES) -> None:
         """
-        entry = cls._transposition_table.get(z_hash)
-        if entry is None:
-            return None, None, None
-        return entry.depth, entry.score, entry.flag
+        guard `table` with `stripes` locks
 
-    @classmethod
-    def get_piece_key(cls, piece: Piece, position: Position | None = None) -> str:
+        :param table: table the threads share
+        :type table: TranspositionTable
+        :param stripes: number of locks, a power of two
+        :type stripes: int
         """
-        helper generates and returns key for piece "type,player,x,y"
+        self.table = table
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._stripe_mask = stripes - 1
+
+    @property
+    def name(self) -> str | None:
+        """name of the shared memory of the table, None if private"""
+        return self.table.name
+
+    @property
+    def generation(self) -> int:
+        """age of the table"""
+        return self.table.generation
+
+    def new_search(self) -> None:
+        """age the table"""
+        self.table.new_search()
+
+    def probe(self, z_hash: int) -> tuple[int, float, int, int] | None:
+        """TranspositionTable.probe under the lock of the bucket of `z_hash`"""
+        with self._locks[z_hash & self._stripe_mask]:
+            return self.table.probe(z_hash)
+
+    def store(
+        self, z_hash: int, depth: int, score: float, flag: int, move: int = 0
+    ) -> None:
+        """TranspositionTable.store under the lock of the bucket of `z_hash`"""
+        with self._locks[z_hash & self._stripe_mask]:
+            self.table.store(z_hash, depth, score, flag, move)
 
-        :param piece: piece the key is for
-        :type piece: Piece
-        :param position: optionally chose the position
-        :type position: Position | None
-        :return: return key to use for lookup
-        :rtype: str
+
+class OpeningBook:
+    """
+    best move of positions near the start of the game, searched deeply
+    offline by build_opening_book, the file is a sorted run of records of
+    a 64 bit BitBoard.position_key and a 16 bit encoded move
+    """
+
+    _RECORD = struct.Struct("<QH")
+    # book loaded from BOOK_PATH, see default
+    _default: "OpeningBook | None" = None
+    __slots__ = ("moves",)
+
+    def __init__(self, moves: dict[int, int] | None = None) -> None:
+        """
+        :param moves: encoded move per position key
+        :type moves: dict[int, int] | None
         """
-        if position is None:
-            position = piece.position
-        pc_type = piece.name.lower()
-        player = piece.player.name.lower()
-        return f"{pc_type}_{player}_{position.x}_{position.y}"
+        self.moves = {} if moves is None else moves
 
     @classmethod
-    def _get_player_key(cls, player: Player | str) -> str:
+    def load(cls, path: str) -> "OpeningBook":
         """
-        helper generates and returns key for whose turn it is
+        read the book at `path`, empty if there is no such file
 
-        :param player: player whose turn it is
-        :type player: Player
-        :return: return key for player turn
-        :rtype: str
+        :param path: book file
+        :type path: str
+        :return: book held in memory
+        :rtype: OpeningBook
         """
-        if isinstance(player, Player):
-            name = player.name.lower()
-        else:
-            name = player.lower()
-        return f"turn_{name}"
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return cls()
+        usable = len(data) - len(data) % cls._RECORD.size
+        return cls(dict(cls._RECORD.iter_unpack(data[:usable])))
 
     @classmethod
-    def _initialise_zobrist_keys(cls) -> None:
-        """initialise key representing each possible square in game, piece x turn x squares"""
-        piece_types = ["king", "queen", "right", "knight", "bishop", "pawn"]
-        players = [white.name.lower(), black.name.lower()]
-        randbits = 64
-        bits_so_far: set[int] = set()
-        for x in range(5):
-            for y in range(5):
-                for p in players:
-                    for pt in piece_types:
-                        key = f"{pt}_{p}_{x}_{y}"
-                        cls._add_unique_randbits_for_key(bits_so_far, key, randbits)
-        for p in players:
-            turn_key = cls._get_player_key(p)
-            while True:
-                random = getrandbits(randbits)
-                if random not in bits_so_far:
-                    cls._z_keys[turn_key] = random
-                    bits_so_far.add(random)
-                    break
+    def default(cls) -> "OpeningBook":
+        """return the book at BOOK_PATH, read once per process"""
+        if cls._default is None:
+            cls._default = cls.load(BOOK_PATH)
+        return cls._default
 
-    @classmethod
-    def _add_unique_randbits_for_key(
-        cls,
-        set_bits: set[int],
-        key: str,
-        randbits: int = 64,
-    ) -> None:
-        """helper adds unique randbits for each key"""
-        while True:
-            random = getrandbits(randbits)
-            if random not in set_bits:
-                cls._z_keys[key] = random
-                set_bits.add(random)
-                return
+    def save(self, path: str) -> None:
+        """
+        write the book to `path`
 
-    @classmethod
-    def _calc_root_hash(cls, root: "Node") -> int:
+        :param path: book file
+        :type path: str
         """
-        calculate hash of node if root
+        record = self._RECORD
+        with open(path, "wb") as file:
+            file.write(b"".join(record.pack(*item) for item in sorted(self.moves.items())))
 
-        :param root: node that hash needs to be created for
-        :type root: "Node"
-        :return: returns hash representing game state
+    def probe(self, board: BitBoard) -> int:
+        """
+        return the book move of `board`, 0 if the position is not in the book
+
+        :param board: position to look up
+        :type board: BitBoard
+        :return: encoded move
         :rtype: int
         """
-        board = root.board
-        z_hash = 0
-        for pc in board.get_pieces():
-            pc_key = cls.get_piece_key(pc)
-            z_hash ^= cls._z_keys[pc_key]
-        player_key = cls._z_keys[cls._get_player_key(board.current_player)]
-        z_hash ^= player_key
-        return z_hash
+        if not self.moves:
+            return 0
+        return self.moves.get(board.position_key(), 0)
 
-    @classmethod
-    def calc_incremental_hash(
-        cls,
-        parent: "Node",
-        piece_to_move: Piece,
-        move_opt: MoveOption,
-        new_board: Board,
-    ) -> int:
+
+class Tablebase:
+    """
+    win, draw or loss and the plies until the game ends of every position
+    of small material such as KQvKN, solved by build_tablebases under the
+    rules of this variant, stalemate loses and pawns only promote to queens
+
+    each table is a file of one byte per position, indexed by side to move
+    and the squares of the white king, white pieces, black king and black
+    pieces, positions where black holds the material a table is named after
+    are looked up mirrored with the colours swapped, en passant rights are
+    not part of the index so positions with an en passant square are not
+    probed
+    """
+
+    # position bytes, 0 is a draw, a win in n plies is n, a loss LOSS + n
+    LOSS = 128
+    # memory mapped table per signature, None once known to be missing
+    _files: dict[str, "mmap.mmap | None"] = {}
+
+    @staticmethod
+    def signatures() -> list[str]:
         """
-        calculate hash for node if is not root (has parents)
+        return the name of every table, each only leads into tables before it
 
-        :param parent: node that this child came from
-        :type parent: "Node"
-        :param piece_to_move: piece that has moved on parent board
-        :type piece_to_move: Piece
-        :param move_opt: move made on the piece to move
-        :type move_opt: MoveOption
-        :param new_board: board state of node we are calculating
-        :type new_board: Board
-        :return: return incremented hash for new node using parent
-        :rtype: int
+        :return: names like KQvK and KRvKP, fewer pawns first
+        :rtype: list[str]
         """
-        # make xor changes to parent hash to avoid full recalculation
-        z_hash = parent.z_hash
-        # remove piece from old position
-        old_pc_key = cls.get_piece_key(piece_to_move)
-        z_hash ^= cls._z_keys[old_pc_key]
-        # remove any pieces that are captured
-        for captured_pos in getattr(move_opt, "captures", []):
-            if square := parent.board[captured_pos]:
-                captured_pc_key = cls.get_piece_key(square.piece)
-                z_hash ^= cls._z_keys[captured_pc_key]
-        # change player turn
-        z_hash ^= cls._z_keys[cls._get_player_key(parent.current_player)]
-        z_hash ^= cls._z_keys[cls._get_player_key(new_board.current_player)]
-        # add moved piece in new position
-        moved_pc = new_board[move_opt.position].piece
-        moved_pc_key = cls.get_piece_key(moved_pc, move_opt.position)
-        z_hash ^= cls._z_keys[moved_pc_key]
-        return z_hash
+        extras = PIECE_LETTERS[1:]
+        names = [f"K{x}vK" for x in extras]
+        names += [f"K{x}vK{y}" for i, x in enumerate(extras) for y in extras[i:]]
+        return sorted(names, key=lambda name: (name.count("P"), len(name)))
 
-    def is_defended_by(self, player: Player, position: Position) -> bool:
+    @staticmethod
+    def locate(board: BitBoard) -> tuple[str, int]:
         """
-        returns true if `position` is defended by another piece
+        return the table name and index of `board`, ignoring its en passant
+        square
 
-        :param player: player we want to check is defending position
-        :type player: Player
-        :param position: position to check defence
-        :type position: Position
-        :return: returns true if position is defended
-        :rtype: bool
+        :param board: position to look up
+        :type board: BitBoard
+        :return: signature and index into its table
+        :rtype: tuple[str, int]
+        """
+        sides = []
+        for colour in (WHITE, BLACK):
+            types, squares = [], [board.king_square(colour)]
+            for piece_type in range(QUEEN, PAWN + 1):
+                for square in iter_squares(board.pieces[colour * 6 + piece_type]):
+                    types.append(piece_type)
+                    squares.append(square)
+            sides.append((-len(types), types, squares))
+        turn = board.turn
+        squares = sides[WHITE][2] + sides[BLACK][2]
+        if sides[WHITE][:2] > sides[BLACK][:2]:
+            sides.reverse()
+            turn ^= 1
+            squares = [MIRROR[square] for square in sides[0][2] + sides[1][2]]
+        name = "v".join(
+            "K" + "".join(PIECE_LETTERS[piece_type] for piece_type in side[1])
+            for side in sides
+        )
+        index = turn
+        for square in squares:
+            index = index * NUM_SQUARES + square
+        return name, index
+
+    @staticmethod
+    def decode(value: int) -> tuple[int, int]:
         """
-        return position in self.attacks_by(player)
+        :param value: byte of a position
+        :type value: int
+        :return: 1, 0 or -1 for a win, draw or loss of the side to move and
+            the plies until the game ends
+        :rtype: tuple[int, int]
+        """
+        if not value:
+            return 0, 0
+        if value < Tablebase.LOSS:
+            return 1, value
+        return -1, value - Tablebase.LOSS
+
+    @classmethod
+    def _open(cls, name: str) -> "mmap.mmap | None":
+        """return the table `name` mapped from TABLEBASE_DIR, None if not built"""
+        if name in cls._files:
+            return cls._files[name]
+        try:
+            with open(os.path.join(TABLEBASE_DIR, name + ".tb"), "rb") as file:
+                table = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            table = None
+        cls._files[name] = table
+        return table
 
-    def attacks_by(self, player: Player) -> set[Position]:
+    @classmethod
+    def probe(cls, board: BitBoard) -> tuple[int, int] | None:
+        """
+        look `board` up in the tablebases
+
+        :param board: position to look up
+        :type board: BitBoard
+        :return: result for the side to move and plies until the game ends
+            as Tablebase.decode, None if no table covers the position
+        :rtype: tuple[int, int] | None
+        """
+        occupied = board.occupancy[WHITE] | board.occupancy[BLACK]
+        if occupied.bit_count() > TABLEBASE_PIECES or board.ep_square != EMPTY:
+            return None
+        if board.only_kings():
+            return 0, 0
+        name, index = cls.locate(board)
+        table = cls._open(name)
+        if table is None:
+            return None
+        return cls.decode(table[index])
+
+    @classmethod
+    def best_move(cls, board: BitBoard) -> int:
         """
-        gathers and returns all square positions player attacks
+        return the move the tablebases rate best for the side to move, the
+        quickest win, else a draw, else the slowest loss
 
-        :param player: player we are checking attacks of
-        :type player: Player
-        :return: set of all positions player attacks
-        :rtype: set[Position]
+        :param board: position to move from
+        :type board: BitBoard
+        :return: encoded move, 0 if the position or one of its children is
+            not covered
+        :rtype: int
         """
-        key = player.name.lower()
-        if key not in self._attacked_by:
-            attacks = set()
-            for pc in self.board.get_player_pieces(player=player):
-                for mv in pc.get_move_options():
-                    if getattr(mv, "captures", None):
-                        attacks.update(mv.captures)
-                    attacks.add(mv.position)
-            self._attacked_by[key] = attacks
-        # *** Fixed bug: return the set of attacks, not the dict itself ***
-        return self._attacked_by[key]
+        if cls.probe(board) is None:
+            return 0
+        best, best_rank = 0, None
+        for move in board.legal_moves():
+            undo = board.make_move(move)
+            hit = cls.probe(board)
+            board.unmake_move(undo)
+            if hit is None:
+                return 0
+            # the child result is for the opponent
+            result, plies = hit
+            rank = (-result, plies if result > 0 else -plies)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best
+
 
-    def get_legal_moves(self) -> list[tuple[Piece, MoveOption]]:
-        """returns cached moves or generates and caches legal moves,
-        updates king position"""
-        if self._cached_moves:
-            return self._cached_moves
+class Node:
+    """
+    holds information representing game state,
+    the board itself is shared and walked by the search with make/unmake
+    """
 
-        legal: list[tuple[Piece, MoveOption]] = []
-        own_king = self.kings[self.current_player.name.lower()]
+    __slots__ = (
+        "parents",
+        "children",
+        "move",
+        "captured",
+        "z_hash",
+        "_cached_moves",
+        "order_score",
+        "_is_terminal",
+    )
 
-        opponents_attacks = self.attacks_by(self.previous_player)
+    def __init__(
+        self,
+        z_hash: int,
+        parent: "Node" | None = None,
+        move: int | None = None,
+        captured: int = EMPTY,
+    ) -> None:
+        """
+        initialise a new node representing unique game state
 
-        for pc in self.board.get_player_pieces(self.current_player):
-            for mv in pc.get_move_options():
-                if isinstance(pc, King):
-                    if mv.position in opponents_attacks:
-                        continue
-                    legal.append((pc, mv))
-                    continue
-                tmp_board = self.board.clone()
-                tmp_pc = tmp_board[pc.position].piece
-                tmp_pc.move(mv)
-                tmp_king = tmp_board[own_king.position].piece
-                if isinstance(tmp_king, King) and tmp_king.is_attacked():
-                    continue
-                legal.append((pc, mv))
+        :param self: this instance of a node
+        :param z_hash: zobrist hash belonging to this game state
+        :type z_hash: int
+        :param parent: node that led to this node, None for root
+        :type parent: 'Node' | None
+        :param move: encoded move that led to this game state
+        :type move: int | None
+        :param captured: code of piece captured by `move`, EMPTY if none
+        :type captured: int
+        :rtype: None
+        """
+        self.parents: list["Node"] = [] if parent is None else [parent]
+        self.children: list["Node"] = []
+        self.move: int | None = move
+        self.captured: int = captured
+        self.order_score: float | None = None
+        self.z_hash: int = z_hash
+        self._cached_moves: list[int] | None = None
+        self._is_terminal: bool | None = None
+
+    def is_defended_by(self, board: BitBoard, colour: int, square: int) -> bool:
+        """
+        returns true if `square` is defended by a piece of `colour`
+
+        :param board: search board positioned at this node
+        :type board: BitBoard
+        :param colour: colour we want to check is defending square
+        :type colour: int
+        :param square: square to check defence
+        :type square: int
+        :return: returns true if square is defended
+        :rtype: bool
+        """
+        return board.attack_count(colour, square) > 0
 
-        self._cached_moves = legal
+    def get_legal_moves(self, board: BitBoard) -> list[int]:
+        """returns cached moves or generates and caches legal moves of `board`"""
+        if self._cached_moves is None:
+            self._cached_moves = board.legal_moves()
         return self._cached_moves
 
-    def is_terminal(self) -> bool:
-        """return true if node is terminal"""
-        if not self._is_terminal:
-            self._is_terminal = get_result(self.board) is not None
+    def is_terminal(self, board: BitBoard) -> bool:
+        """return true if node is terminal, side to move has no moves or only kings remain"""
+        if self._is_terminal is None:
+            self._is_terminal = not self.get_legal_moves(board) or board.only_kings()
         return self._is_terminal
 
-    def expand(self) -> None:
-        """generates children lazily one depth lower than this node
-        or if already generated links"""
-        if self.children or self.is_terminal():
+    def expand(self, board: BitBoard) -> None:
+        """generates the children not yet made one depth lower than this node,
+        `board` must be positioned at this node"""
+        if self.is_terminal(board):
+            return
+        moves = self.get_legal_moves(board)
+        if len(self.children) == len(moves):
             return
-        for pc, mv in self.get_legal_moves():
-            new_board = self.board.clone()
-            new_pc = new_board[pc.position].piece
-            new_pc.move(mv)
-            child_hash = Node.calc_incremental_hash(self, pc, mv, new_board)
-            child = Node(
-                board=new_board,
-                parent=self,
-                move=(pc, mv),
-                z_hash=child_hash,
+        known = {child.move for child in self.children}
+        for mv in moves:
+            if mv in known:
+                continue
+            undo = board.make_move(mv)
+            self.children.append(
+                Node(board.z_hash, parent=self, move=mv, captured=undo[1])
             )
-            if isinstance(pc, King):
-                child.kings[pc.player.name.lower()] = new_pc
-            self.children.append(child)
+            board.unmake_move(undo)
+
+    def child(self, move: int, z_hash: int, captured: int) -> "Node":
+        """
+        return the child reached by `move`, made and linked on first visit,
+        the search walks moves and only builds the children it plays
+
+        :param move: encoded move played from this node
+        :type move: int
+        :param z_hash: hash of the position after `move`
+        :type z_hash: int
+        :param captured: code of piece captured by `move`, EMPTY if none
+        :type captured: int
+        :return: child node of `move`
+        :rtype: Node
+        """
+        for child in self.children:
+            if child.move == move:
+                return child
+        child = Node(z_hash, parent=self, move=move, captured=captured)
+        self.children.append(child)
+        return child
 
 
 class Search:
@@ -389,31 +1681,596 @@ class Search:
         "checkmate": 2000,
         "unsafe_move": -2,
     }
+    # per piece type lookup of the values above
+    _PIECE_VALUES = tuple(map(MAP_PIECE_TO_VALUE.get, PIECE_NAMES))
+    # slack left for positional terms when delta pruning quiescence captures
+    DELTA_MARGIN = 4.0
+    # score of a tablebase win less the plies to the end of the game, far
+    # above any evaluation so proven results always decide
+    TABLEBASE_SCORE = 1000.0
+    # exchange value of the king, above every other piece put together
+    SEE_KING_VALUE = 100
+    # move ordering lift of quiet moves, first and second killer slot
+    KILLER_BONUS = (1.0, 0.8)
+    # lift of the quiet move with the highest history score
+    HISTORY_WEIGHT = 0.5
+    # half width of the first root aspiration window and tries before a full window
+    ASPIRATION_WINDOW = 0.5
+    ASPIRATION_ATTEMPTS = 2
+    # depth taken off the null move search and least depth to try it at
+    NULL_MOVE_REDUCTION = 2
+    NULL_MOVE_MIN_DEPTH = 3
+    # late quiet moves are searched one ply shallower, from this move number and depth
+    LMR_REDUCTION = 1
+    LMR_MIN_MOVES = 3
+    LMR_MIN_DEPTH = 3
+
+    # engine kept per colour across moves of a game, see for_player
+    _engines: dict[int, "Search"] = {}
 
-    def __init__(self, root_board: Board, agent_player: Player):
-        self.root = Node(root_board)
+    def __init__(
+        self,
+        root_board: Board,
+        agent_player: Player | str,
+        tt: TranspositionTable | None = None,
+    ):
+        self.root_board = root_board
+        # single board walked depth first with make/unmake by the whole search
+        self.board = BitBoard.from_board(root_board)
+        self.root = Node(self.board.z_hash)
         self.agent_player = agent_player
+        self.agent = colour_of(agent_player)
+        # lazy SMP, helper processes share the table which must then be in
+        # shared memory, helpers report each completed iteration to `report`
+        self.workers = SMP_WORKERS
+        self.depth_offset = 0
+        self.root_rotation = 0
+        self.report: Callable[[int, float, int], None] | None = None
+        self.threads = SMP_THREADS
+        if tt is None:
+            tt = TranspositionTable.for_colour(self.agent, shared=self.workers > 0)
+            tt.new_search()
+        self.tt = tt
         self._max_quiesce_depth = 2
+        self.reset_heuristics()
+        self.deadline = inf
+        # principal variation search and root aspiration windows, switch off
+        # to benchmark against plain full window alpha-beta
+        self.use_pvs = True
+        # selective pruning, each with its own switch and counters
+        self.use_null_move = True
+        self.use_lmr = True
+        # static exchange evaluation orders captures and drops losing ones
+        # in quiescence
+        self.use_see = True
+        self.use_delta_pruning = True
+        # play the opening book move without searching when there is one
+        self.use_book = True
+        # look positions of few pieces up in the endgame tablebases
+        self.use_tablebase = True
+        # with keep_tree the nodes searched stay linked under the root until
+        # the search is dropped, caching their move lists between iterations,
+        # without it only the root, its children and the current line live
+        self.keep_tree = False
+        # peak bytes allocated during search(), only measured with
+        # trace_memory since tracing slows every allocation
+        self.trace_memory = False
+        # whether the last root was reached from the one before it
+        self.continued = False
+        # encoded best move of the last search, 0 if it had none
+        self.best_move = 0
+        # set by stop from another thread, cleared when a move is asked for
+        self.stop_requested = False
+        # shared flag a lazy SMP helper is stopped with by the main process
+        self.stop_signal: Any = None
+        # root, boards and heuristics of the last real search while pondering,
+        # put back by set_root if the opponent did not play the expected reply
+        self.before_ponder: tuple[Any, ...] | None = None
+        self.reset_counters()
+
+    @classmethod
+    def for_player(cls, root_board: Board, agent_player: Player) -> "Search":
+        """
+        return the engine of `agent_player` moved to `root_board`, made on
+        first use and kept for the rest of the game so each move starts
+        from what the previous searches learnt
+
+        :param root_board: position to search next
+        :type root_board: Board
+        :param agent_player: player the engine moves for
+        :type agent_player: Player
+        :return: engine ready to search `root_board`
+        :rtype: Search
+        """
+        colour = colour_of(agent_player)
+        engine = cls._engines.get(colour)
+        if engine is None:
+            engine = cls._engines[colour] = cls(root_board, agent_player)
+        else:
+            engine.stop_requested = False
+            engine.set_root(root_board)
+        return engine
 
-    def search(self, depth: int = 3) -> tuple[Piece | None, MoveOption | None]:
-        """return best move found up to set depth or none if no move found"""
+    def set_root(self, root_board: Board) -> None:
+        """
+        move this engine to `root_board`, if it is the position the engine
+        already stands on (pondered on) everything is kept, after a ponder
+        on another position the last real root and its heuristics are put
+        back first, if it follows the last root by one move of each side
+        the killer slots move up two plies and the history is halved,
+        otherwise the heuristics start afresh, the transposition table is
+        kept either way
+
+        :param root_board: position to search next
+        :type root_board: Board
+        """
+        board = BitBoard.from_board(root_board)
+        before_ponder, self.before_ponder = self.before_ponder, None
+        if board.z_hash == self.board.z_hash:
+            self.continued = True
+        else:
+            if before_ponder is not None:
+                # the prediction missed, continue from the last real search
+                (
+                    self.root,
+                    self.root_board,
+                    self.board,
+                    self.killers,
+                    self.history,
+                    self.history_max,
+                ) = before_ponder
+            self.continued = self._is_continuation(board.z_hash)
+            if self.continued:
+                self.age_heuristics()
+            else:
+                self.reset_heuristics()
+            self.root = Node(board.z_hash)
+        self.root_board = root_board
+        self.board = board
+        self.tt.new_search()
+        self.reset_counters()
+
+    def _is_continuation(self, z_hash: int) -> bool:
+        """
+        return true if the position hashed `z_hash` follows the last root
+        by one move of each side
+
+        :param z_hash: hash of the new root
+        :type z_hash: int
+        :return: whether two plies lead from the last root to it
+        :rtype: bool
+        """
+        board = self.board
+        for first in board.legal_moves():
+            undo = board.make_move(first)
+            for reply in board.legal_moves():
+                reply_undo = board.make_move(reply)
+                reached = board.z_hash == z_hash
+                board.unmake_move(reply_undo)
+                if reached:
+                    board.unmake_move(undo)
+                    return True
+            board.unmake_move(undo)
+        return False
+
+    def reset_counters(self) -> None:
+        """zero the statistics gathered by a search"""
+        self.nodes = 0
+        self.depth_reached = 0
+        self.pvs_researches = 0
+        self.aspiration_fails = 0
+        self.null_move_tries = 0
+        self.null_move_cutoffs = 0
+        self.lmr_reductions = 0
+        self.lmr_researches = 0
+        self.see_pruned = 0
+        self.delta_pruned = 0
+        self.tablebase_hits = 0
+        self.live_nodes = 0
+        self.peak_nodes = 0
+        self.peak_memory = 0
+        self.helper_depth = 0
+
+    def search(
+        self, depth: int | None = None, time_limit: float | None = None
+    ) -> tuple[Piece | None, MoveOption | None]:
+        """
+        deepen iteratively (1, 2, 3, ...) until `depth` is reached or
+        `time_limit` runs out, returning the move of the deepest completed
+        iteration or Nones if there is no move
+
+        :param depth: deepest iteration to search, unlimited if None
+        :type depth: int | None
+        :param time_limit: seconds the search may take, unlimited if None
+        :type time_limit: float | None
+        :return: best move found as chessmaker piece and move option
+        :rtype: tuple[Piece | None, MoveOption | None]
+        """
+        if self.trace_memory:
+            tracemalloc.start()
+        try:
+            return self._search(depth, time_limit)
+        finally:
+            if self.trace_memory:
+                self.peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+    def _search(
+        self, depth: int | None, time_limit: float | None
+    ) -> tuple[Piece | None, MoveOption | None]:
+        """iterative deepening loop of `search`"""
+        start = perf_counter()
+        self.deadline = inf if time_limit is None else start + time_limit
+        max_depth = MAX_SEARCH_DEPTH if depth is None else depth
+        root_position = self.board.copy()
+        children = self.get_ordered_children(self.root, 0)
+        self.live_nodes = self.peak_nodes = 1 + len(children)
+        self.best_move = 0
+        if not children:
+            return None, None
+        best_move = children[0].move
+        score = 0.0
+        if self.use_book:
+            book_move = OpeningBook.default().probe(self.board)
+            if any(child.move == book_move for child in children):
+                self.best_move = book_move
+                return BitBoard.to_move_option(self.root_board, book_move)
+        if self.use_tablebase:
+            tablebase_move = Tablebase.best_move(self.board)
+            if tablebase_move:
+                self.best_move = tablebase_move
+                return BitBoard.to_move_option(self.root_board, tablebase_move)
+        if len(children) > 1:
+            helpers = self._start_helpers(depth, time_limit) if self.workers else None
+            threads = None
+            if self.threads > 1 and free_threaded():
+                threads = self._start_threads(depth)
+            for current in range(1 + self.depth_offset, max_depth + 1):
+                try:
+                    score, best_move = self._search_iteration(
+                        current, best_move, score
+                    )
+                except SearchTimeout:
+                    # the board was left mid-line when the search unwound
+                    self.board = root_position
+                    break
+                self.depth_reached = current
+                if self.report is not None:
+                    self.report(current, score, best_move)
+                # a forced mate or tablebase result needs no deeper look
+                if abs(score) == inf or abs(score) > Search.TABLEBASE_SCORE / 2:
+                    break
+                elapsed = perf_counter() - start
+                if time_limit is not None and elapsed > time_limit * SOFT_TIME_RATIO:
+                    break
+            if threads is not None:
+                best_move = self._join_threads(threads, best_move)
+            if helpers is not None:
+                best_move = self._join_helpers(helpers, best_move)
+        self.best_move = best_move
+        return BitBoard.to_move_option(self.root_board, best_move)
+
+    def _search_iteration(
+        self, depth: int, first_move: int, previous_score: float
+    ) -> tuple[float, int]:
+        """
+        run one iteration, with pvs the root is first searched in an
+        aspiration window around `previous_score` that widens on failure
+
+        :param depth: depth of this iteration
+        :type depth: int
+        :param first_move: best move of the previous iteration
+        :type first_move: int
+        :param previous_score: score of the previous iteration
+        :type previous_score: float
+        :return: best score and its move
+        :rtype: tuple[float, int]
+        """
+        if not self.use_pvs or depth == 1 or abs(previous_score) == inf:
+            return self._search_root(depth, first_move)
+        delta = Search.ASPIRATION_WINDOW
+        for _ in range(Search.ASPIRATION_ATTEMPTS):
+            alpha, beta = previous_score - delta, previous_score + delta
+            score, move = self._search_root(depth, first_move, alpha, beta)
+            if alpha < score < beta:
+                return score, move
+            self.aspiration_fails += 1
+            first_move = move
+            delta *= 4
+        return self._search_root(depth, first_move)
+
+    def _search_root(
+        self,
+        depth: int,
+        first_move: int | None,
+        alpha: float = -inf,
+        beta: float = inf,
+    ) -> tuple[float, int]:
+        """
+        search every root child to `depth`, trying `first_move` first,
+        without pvs every child gets a full window, with pvs the first child
+        gets (alpha, beta) and the rest a null window re-searched on fail high
+
+        :param depth: depth of this iteration
+        :type depth: int
+        :param first_move: best move of the previous iteration
+        :type first_move: int | None
+        :param alpha: lower bound of the root window
+        :type alpha: float
+        :param beta: upper bound of the root window
+        :type beta: float
+        :return: best score and its move, the score is a bound if it falls
+            outside the window
+        :rtype: tuple[float, int]
+        """
+        board = self.board
+        children = self.get_ordered_children(self.root, 0)
+        children.sort(key=lambda n: n.move != first_move)
+        if self.root_rotation:
+            # helpers walk the root in different orders so they share less work
+            shift = 1 + self.root_rotation % len(children)
+            children = children[:1] + children[shift:] + children[1:shift]
         best_score = -inf
-        best_child = None
-        children = self.get_ordered_children(self.root)
+        best_child = children[0]
         for child in children:
-            score = self.alphabeta(child, -inf, inf, depth - 1)
+            undo = board.make_move(child.move)
+            if not self.use_pvs:
+                score = self.alphabeta(child, -inf, inf, depth - 1, 1)
+            elif best_score == -inf:
+                score = self.alphabeta(child, alpha, beta, depth - 1, 1)
+            else:
+                floor = max(alpha, best_score)
+                score = self.alphabeta(child, floor, floor + NULL_WINDOW, depth - 1, 1)
+                if floor < score < beta:
+                    self.pvs_researches += 1
+                    score = self.alphabeta(child, floor, beta, depth - 1, 1)
+            board.unmake_move(undo)
             if score > best_score:
                 best_score = score
                 best_child = child
-        if best_child is None:
-            return None, None
-        return best_child.move
+                if self.use_pvs and best_score >= beta:
+                    break
+        return best_score, best_child.move
+
+    def _start_helpers(
+        self, depth: int | None, time_limit: float | None
+    ) -> tuple[Any, Any, list[Any]]:
+        """
+        start `workers` helper processes searching the root into the shared
+        transposition table, odd helpers iterate one ply deeper than this
+        search and every helper walks the root in its own order
+
+        :param depth: deepest iteration to search, unlimited if None
+        :type depth: int | None
+        :param time_limit: seconds the search may take, unlimited if None
+        :type time_limit: float | None
+        :return: stop flag, result queue and the processes
+        :rtype: tuple[Any, Any, list[Any]]
+        """
+        if self.tt.name is None:
+            self.tt = TranspositionTable.for_colour(self.agent, shared=True)
+        context = multiprocessing.get_context()
+        # a flag polled with the clock, an Event would hang the main process
+        # on set() if a helper ended while still waiting on it
+        stop = context.RawValue("b", 0)
+        results = context.Queue()
+        processes = []
+        for worker in range(1, self.workers + 1):
+            process = context.Process(
+                target=_helper_search,
+                args=(
+                    BitBoard._z_keys,
+                    self.board,
+                    COLOUR_NAMES[self.agent],
+                    self.tt.name,
+                    self.tt.size_mb,
+                    self.tt.generation,
+                    worker,
+                    depth,
+                    time_limit,
+                    stop,
+                    results,
+                ),
+                daemon=True,
+            )
+            process.start()
+            processes.append(process)
+        return stop, results, processes
+
+    def _join_helpers(self, helpers: tuple[Any, Any, list[Any]], best_move: int) -> int:
+        """
+        stop the helpers and return the move of the deepest iteration
+        completed by this search or any helper, this search wins ties
+
+        :param helpers: stop flag, result queue and processes of the helpers
+        :type helpers: tuple[Any, Any, list[Any]]
+        :param best_move: best move of the deepest iteration of this search
+        :type best_move: int
+        :return: best move of the deepest completed iteration
+        :rtype: int
+        """
+        stop, results, processes = helpers
+        stop.value = 1
+        for process in processes:
+            process.join(SMP_JOIN_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        reports = []
+        while True:
+            try:
+                reports.append(results.get_nowait())
+            except queue.Empty:
+                break
+        results.close()
+        return self._deepest(reports, best_move)
+
+    def _deepest(self, reports: list[tuple[int, float, int]], best_move: int) -> int:
+        """
+        return the move of the deepest iteration among the (depth, score,
+        move) `reports` of helpers and this search, this search wins ties
+
+        :param reports: completed iterations of the helpers
+        :type reports: list[tuple[int, float, int]]
+        :param best_move: best move of the deepest iteration of this search
+        :type best_move: int
+        :return: best move of the deepest completed iteration
+        :rtype: int
+        """
+        best_depth = self.depth_reached
+        for depth, _, move in reports:
+            self.helper_depth = max(self.helper_depth, depth)
+            if depth > best_depth:
+                best_depth, best_move = depth, move
+        return best_move
+
+    def _start_threads(
+        self, depth: int | None
+    ) -> tuple[list["Search"], list[threading.Thread], list[tuple[int, float, int]], Any]:
+        """
+        start `threads` - 1 helper threads searching the root with their own
+        board, killer slots and history into the table of this search, which
+        is guarded by lock stripes until they are joined, odd helpers iterate
+        one ply deeper and every helper walks the root in its own order, only
+        this search keeps the deadline and stops the helpers when it ends
+
+        :param depth: deepest iteration to search, unlimited if None
+        :type depth: int | None
+        :return: helper engines, their threads, the list they report
+            completed iterations to and the unguarded table
+        :rtype: tuple[list[Search], list[threading.Thread],
+            list[tuple[int, float, int]], Any]
+        """
+        table = self.tt
+        self.tt = StripedTable(table)
+        reports: list[tuple[int, float, int]] = []
+        engines = []
+        threads = []
+        for helper in range(1, self.threads):
+            engine = Search(self.board.to_board(), self.agent_player, self.tt)
+            engine.workers = 0
+            engine.threads = 0
+            engine.depth_offset = helper & 1
+            engine.root_rotation = helper
+            engine.report = lambda done, score, move: reports.append((done, score, move))
+            thread = threading.Thread(target=engine.search, args=(depth,), daemon=True)
+            thread.start()
+            engines.append(engine)
+            threads.append(thread)
+        return engines, threads, reports, table
+
+    def _join_threads(
+        self,
+        threads: tuple[
+            list["Search"], list[threading.Thread], list[tuple[int, float, int]], Any
+        ],
+        best_move: int,
+    ) -> int:
+        """
+        stop and join the helper threads, put back the unguarded table and
+        return the move of the deepest completed iteration
+
+        :param threads: helper engines, threads, reports and table
+        :type threads: tuple
+        :param best_move: best move of the deepest iteration of this search
+        :type best_move: int
+        :return: best move of the deepest completed iteration
+        :rtype: int
+        """
+        engines, helper_threads, reports, table = threads
+        for engine in engines:
+            engine.stop()
+        for thread in helper_threads:
+            thread.join()
+        self.tt = table
+        return self._deepest(reports, best_move)
+
+    def _check_time(self) -> None:
+        """count a node and raise SearchTimeout if the deadline has passed
+        or another thread asked the search to stop"""
+        self.nodes += 1
+        if not self.nodes & (TIME_CHECK_INTERVAL - 1) and (
+            self.stop_requested
+            or perf_counter() > self.deadline
+            or self.stop_signal is not None
+            and self.stop_signal.value
+        ):
+            raise SearchTimeout
+
+    def stop(self) -> None:
+        """make a search running in another thread unwind at its next clock check"""
+        self.stop_requested = True
+
+    def ponder(self) -> bool:
+        """
+        search on the opponent's time, play the best move of the last search
+        and the reply the transposition table expects and search that
+        position until `stop` is called, if the opponent plays the expected
+        reply the next search starts from the tables this one filled
+
+        :return: false if no reply could be predicted
+        :rtype: bool
+        """
+        if not self.best_move or self.stop_requested:
+            return False
+        board = self.board.copy()
+        board.make_move(self.best_move)
+        entry = self.tt.probe(board.z_hash)
+        reply = 0 if entry is None else entry[3]
+        if not reply or reply not in board.legal_moves():
+            return False
+        board.make_move(reply)
+        if not board.legal_moves():
+            return False
+        before_ponder = (
+            self.root,
+            self.root_board,
+            self.board,
+            [slots[:] for slots in self.killers],
+            [table[:] for table in self.history],
+            self.history_max,
+        )
+        self.set_root(board.to_board())
+        self.before_ponder = before_ponder
+        self.search()
+        return True
 
     def _quiesce(
-        self, node: Node, alpha: float, beta: float, maximising: bool, depth: int = 0
+        self,
+        alpha: float,
+        beta: float,
+        maximising: bool,
+        depth: int = 0,
+        move: int | None = None,
+        captured: int = EMPTY,
+        moves: list[int] | None = None,
     ) -> float:
-        """extend the leaf evaluations through capture moves (limited depth)"""
-        stand_pat = self.evaluate(node)
+        """
+        extend the leaf evaluations through capture, promotion and checking
+        moves (limited depth), walked with make/unmake on the search board
+        without building nodes
+
+        :param alpha: lower bound of the window
+        :type alpha: float
+        :param beta: upper bound of the window
+        :type beta: float
+        :param maximising: whether the side to move is the agent
+        :type maximising: bool
+        :param depth: quiescence plies played so far
+        :type depth: int
+        :param move: encoded move that led to this position, None at the root
+        :type move: int | None
+        :param captured: code of piece captured by `move`, EMPTY if none
+        :type captured: int
+        :param moves: legal moves of this position if already generated
+        :type moves: list[int] | None
+        :return: score of the position in agent perspective
+        :rtype: float
+        """
+        self._check_time()
+        board = self.board
+        if moves is None:
+            moves = board.legal_moves()
+        stand_pat = self.evaluate_position(moves, move, captured)
         if maximising:
             if stand_pat >= beta:
                 return beta
@@ -424,22 +2281,48 @@ class Search:
             beta = min(stand_pat, beta)
         if depth >= self._max_quiesce_depth:
             return stand_pat
-        for pc, mv in node.get_legal_moves():
-            is_capture = bool(getattr(mv, "captures", None))
-            is_promo = pc.name.lower() == "pawn" and mv.position.y in (0, 4)
-            is_check = self._is_check_move(node, pc, mv)
-            if not (is_capture or is_promo or is_check):
-                continue
-            new_board = node.board.clone()
-            new_pc = new_board[pc.position].piece
-            new_pc.move(mv)
-            child = Node(
-                new_board,
-                node,
-                (pc, mv),
-                Node.calc_incremental_hash(node, pc, mv, new_board),
+        enemy = board.occupancy[board.turn ^ 1]
+        mailbox = board.mailbox
+        values = Search._PIECE_VALUES
+        use_see = self.use_see
+        # a capture that cannot bring the score back to the window even with
+        # its full material and capture bonus is not tried
+        bound = alpha - stand_pat if maximising else stand_pat - beta
+        delta_prune = self.use_delta_pruning and not board.in_check(board.turn)
+        tactical: list[tuple[float, int]] = []
+        for mv in moves:
+            to = (mv >> 5) & 31
+            is_capture = bool(enemy & (1 << to)) or bool(mv & EN_PASSANT)
+            if is_capture or mv & PROMOTION:
+                if delta_prune:
+                    if mv & EN_PASSANT:
+                        victim = values[PAWN]
+                    elif mailbox[to] != EMPTY:
+                        victim = values[mailbox[to] % 6]
+                    else:
+                        victim = 0
+                    swing = victim * (1 + Search.bonus["capture"])
+                    if mv & PROMOTION:
+                        swing += values[QUEEN] - values[PAWN] + Search.bonus["promotion"]
+                    if swing + Search.DELTA_MARGIN < bound and not board.gives_check(mv):
+                        self.delta_pruned += 1
+                        continue
+                exchange = board.see(mv) if use_see else 0.0
+                if exchange < 0:
+                    # losing captures cannot lift the stand pat score
+                    self.see_pruned += 1
+                    continue
+                tactical.append((exchange, mv))
+            elif board.gives_check(mv):
+                tactical.append((0.0, mv))
+        if use_see:
+            tactical.sort(key=lambda item: item[0], reverse=True)
+        for _, mv in tactical:
+            undo = board.make_move(mv)
+            score = self._quiesce(
+                alpha, beta, not maximising, depth + 1, mv, undo[1]
             )
-            score = self._quiesce(child, alpha, beta, not maximising, depth + 1)
+            board.unmake_move(undo)
             if maximising:
                 alpha = max(alpha, score)
                 if alpha >= beta:
@@ -450,27 +2333,9 @@ class Search:
                     break
         return alpha if maximising else beta
 
-    def _is_check_move(self, node: Node, piece: Piece, move: MoveOption) -> bool:
-        if isinstance(node, Node) and node.move == (piece, move):
-            opp_king = node.kings.get(node.previous_player.name.lower())
-            if opp_king is None:
-                return False
-            return opp_king.position in node.attacks_by(node.current_player)
-        tmp = node.board.clone()
-        tmp_piece = tmp[piece.position].piece
-        if tmp_piece is None:
-            return False
-        tmp_piece.move(move)
-        opp_king_piece = node.kings.get(node.previous_player.name.lower())
-        if opp_king_piece is None:
-            return False
-        opp_king_square = opp_king_piece.position
-        opp_king_piece = tmp[opp_king_square].piece
-        return (
-            opp_king_piece.is_attacked() if isinstance(opp_king_piece, King) else False
-        )
-
-    def alphabeta(self, node: Node, alpha: float, beta: float, depth: int) -> float:
+    def alphabeta(
+        self, node: Node, alpha: float, beta: float, depth: int, ply: int = 1
+    ) -> float:
         """
         attempts to return highest guaranteed score agent_player can make
 
@@ -481,201 +2346,919 @@ class Search:
         :param beta: the worst score found so far
         :type beta: float
         :param depth: current depth of game tree expansion
+        :param ply: distance of `node` from the root
+        :type ply: int
         :return: highest guaranteed score
         :rtype: float
         """
-        entry_depth, entry_val, entry_flag = Node.get_entry_in_tt(node.z_hash)
-        if entry_depth is not None and entry_depth >= depth:
-            if entry_flag == "EXACT":
+        self._check_time()
+        board = self.board
+        if (
+            self.use_tablebase
+            and (board.occupancy[WHITE] | board.occupancy[BLACK]).bit_count()
+            <= TABLEBASE_PIECES
+        ):
+            val = self._probe_tablebase(ply)
+            if val is not None:
+                return val
+        entry = self.tt.probe(node.z_hash)
+        hash_move = 0
+        if entry is not None:
+            entry_depth, entry_val, entry_flag, hash_move = entry
+        if entry is not None and entry_depth >= depth:
+            if entry_flag == EXACT:
                 return entry_val
-            if entry_flag == "LOWER" and entry_val > alpha:
+            if entry_flag == LOWER and entry_val > alpha:
                 alpha = entry_val
-            if entry_flag == "UPPER" and entry_val < beta:
+            if entry_flag == UPPER and entry_val < beta:
                 beta = entry_val
             if alpha >= beta:
                 return entry_val
+        # window actually searched, decides the bound stored afterwards
+        window_alpha, window_beta = alpha, beta
 
-        if depth == 0 or node.is_terminal():
+        if depth == 0 or node.is_terminal(board):
             val = self._quiesce(
-                node,
-                alpha=-inf,
-                beta=inf,
-                maximising=node.current_player == self.agent_player,
+                alpha=alpha,
+                beta=beta,
+                maximising=board.turn == self.agent,
+                move=node.move,
+                captured=node.captured,
+                moves=node.get_legal_moves(board),
             )
-            Node.add_entry_in_tt(node, depth=depth, value=val, flag="EXACT")
+            # quiescence fails hard, a score on the window edge is a bound
+            if val <= alpha:
+                flag = UPPER
+            elif val >= beta:
+                flag = LOWER
+            else:
+                flag = EXACT
+            self.tt.store(node.z_hash, depth, val, flag)
             return val
 
-        children = self.get_ordered_children(node)
-
-        is_maximising = node.current_player == self.agent_player
+        is_maximising = board.turn == self.agent
+        in_check = board.in_check(board.turn)
+        if self._try_null_move(node, alpha, beta, depth, ply, in_check):
+            return beta if is_maximising else alpha
+
+        moves = self.iter_moves(node, hash_move, ply)
+        use_pvs = self.use_pvs
+        keep_tree = self.keep_tree
+        lmr = self.use_lmr and depth >= Search.LMR_MIN_DEPTH and not in_check
+        killers = self.killers[ply]
+        best_move = 0
         if is_maximising:
             best = -inf
-            for child in children:
-                val = self.alphabeta(child, alpha, beta, depth - 1)
-                best = max(val, best)
+            for index, move in enumerate(moves):
+                undo = board.make_move(move)
+                child = self._child(node, move, undo[1])
+                if (
+                    lmr
+                    and alpha > -inf
+                    and index >= Search.LMR_MIN_MOVES
+                    and self._is_late_quiet(child, killers)
+                ):
+                    self.lmr_reductions += 1
+                    val = self.alphabeta(
+                        child,
+                        alpha,
+                        alpha + NULL_WINDOW,
+                        depth - 1 - Search.LMR_REDUCTION,
+                        ply + 1,
+                    )
+                    full = val > alpha
+                    self.lmr_researches += full
+                else:
+                    full = True
+                if not full:
+                    pass
+                elif use_pvs and best_move and alpha > -inf:
+                    val = self.alphabeta(
+                        child, alpha, alpha + NULL_WINDOW, depth - 1, ply + 1
+                    )
+                    if alpha < val < beta:
+                        self.pvs_researches += 1
+                        val = self.alphabeta(child, alpha, beta, depth - 1, ply + 1)
+                else:
+                    val = self.alphabeta(child, alpha, beta, depth - 1, ply + 1)
+                board.unmake_move(undo)
+                self.live_nodes -= not keep_tree
+                if val > best or not best_move:
+                    best = val
+                    best_move = move
                 alpha = max(alpha, best)
                 if beta <= alpha:
+                    self._record_cutoff(child, ply, depth)
                     break
-            flag = "EXACT" if alpha < beta else "LOWER"
         else:
             best = inf
-            for child in children:
-                val = self.alphabeta(child, alpha, beta, depth - 1)
-                best = min(val, best)
+            for index, move in enumerate(moves):
+                undo = board.make_move(move)
+                child = self._child(node, move, undo[1])
+                if (
+                    lmr
+                    and beta < inf
+                    and index >= Search.LMR_MIN_MOVES
+                    and self._is_late_quiet(child, killers)
+                ):
+                    self.lmr_reductions += 1
+                    val = self.alphabeta(
+                        child,
+                        beta - NULL_WINDOW,
+                        beta,
+                        depth - 1 - Search.LMR_REDUCTION,
+                        ply + 1,
+                    )
+                    full = val < beta
+                    self.lmr_researches += full
+                else:
+                    full = True
+                if not full:
+                    pass
+                elif use_pvs and best_move and beta < inf:
+                    val = self.alphabeta(
+                        child, beta - NULL_WINDOW, beta, depth - 1, ply + 1
+                    )
+                    if alpha < val < beta:
+                        self.pvs_researches += 1
+                        val = self.alphabeta(child, alpha, beta, depth - 1, ply + 1)
+                else:
+                    val = self.alphabeta(child, alpha, beta, depth - 1, ply + 1)
+                board.unmake_move(undo)
+                self.live_nodes -= not keep_tree
+                if val < best or not best_move:
+                    best = val
+                    best_move = move
                 beta = min(beta, best)
                 if beta <= alpha:
+                    self._record_cutoff(child, ply, depth)
                     break
-            flag = "EXACT" if beta > alpha else "UPPER"
 
-        Node.add_entry_in_tt(node, depth=depth, value=best, flag=flag)
+        if best <= window_alpha:
+            flag = UPPER
+        elif best >= window_beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(node.z_hash, depth, best, flag, best_move)
         return best
 
-    def evaluate(self, node: Node) -> float:
-        """return score for game state in agent_player perspective"""
-        if node.is_terminal():
-            if (
-                node.kings[node.current_player.name.lower()].is_attacked()
-                or not node.get_legal_moves()
-            ):
-                return inf if node.current_player != self.agent_player else -inf
-            return 0.0
-
-        opponent = node.previous_player
-        opponent_attacks = node.attacks_by(opponent)
+    def _child(self, node: Node, move: int, captured: int) -> Node:
+        """
+        return the node of `move` just played from `node`, linked into the
+        tree with keep_tree, else a detached node the caller drops once the
+        move is taken back, and track the live and peak node counts
 
-        material = centre = development = pawn_progress = safety = 0.0
+        :param node: node the move was played from
+        :type node: Node
+        :param move: encoded move on the search board
+        :type move: int
+        :param captured: code of piece captured by `move`, EMPTY if none
+        :type captured: int
+        :return: node of the position after `move`
+        :rtype: Node
+        """
+        if self.keep_tree:
+            known = len(node.children)
+            child = node.child(move, self.board.z_hash, captured)
+            self.live_nodes += len(node.children) - known
+        else:
+            child = Node(self.board.z_hash, move=move, captured=captured)
+            self.live_nodes += 1
+        if self.live_nodes > self.peak_nodes:
+            self.peak_nodes = self.live_nodes
+        return child
 
-        for pc in node.board.get_pieces():
-            name = pc.name.lower()
-            value = self.MAP_PIECE_TO_VALUE.get(name, 0)
-            material += value if pc.player == self.agent_player else -value
+    def _try_null_move(
+        self,
+        node: Node,
+        alpha: float,
+        beta: float,
+        depth: int,
+        ply: int,
+        in_check: bool,
+    ) -> bool:
+        """
+        let the side to move pass and search the reply shallower, return true
+        if even that fails outside the window so `node` can be cut
 
-            if (pc.position.x, pc.position.y) in Search.CENTRE_SQUARES:
-                centre += (
-                    (Search.bonus["centre"] * Search.MAP_PIECE_CENTER_TO_VALUE[name])
-                    if pc.player == self.agent_player
-                    else -(
-                        Search.bonus["centre"] * Search.MAP_PIECE_CENTER_TO_VALUE[name]
-                    )
-                )
+        not tried in check, twice in a row, or when the side to move has only
+        king and pawns, where passing could be better than any move (zugzwang,
+        stalemate loses in this variant)
 
-            if pc.player == self.agent_player and pc.position in opponent_attacks:
-                safety += self.bonus["safety"] * value
+        :param node: node being searched, the board is at it
+        :type node: Node
+        :param alpha: lower bound of the window of `node`
+        :type alpha: float
+        :param beta: upper bound of the window of `node`
+        :type beta: float
+        :param depth: remaining depth of `node`
+        :type depth: int
+        :param ply: distance of `node` from the root
+        :type ply: int
+        :param in_check: whether the side to move is in check
+        :type in_check: bool
+        :return: true if the null move search cut `node`
+        :rtype: bool
+        """
+        board = self.board
+        us = board.turn
+        is_maximising = us == self.agent
+        if (
+            not self.use_null_move
+            or in_check
+            or depth < Search.NULL_MOVE_MIN_DEPTH
+            # a node without a move was itself reached by a null move
+            or node.move is None
+            or (beta == inf if is_maximising else alpha == -inf)
+        ):
+            return False
+        pawns_and_king = board.pieces[us * 6 + PAWN] | board.pieces[us * 6 + KING]
+        if not board.occupancy[us] & ~pawns_and_king:
+            return False
+        self.null_move_tries += 1
+        undo = board.make_null_move()
+        child = Node(board.z_hash, node if self.keep_tree else None)
+        reduced = depth - 1 - Search.NULL_MOVE_REDUCTION
+        if is_maximising:
+            val = self.alphabeta(child, beta - NULL_WINDOW, beta, reduced, ply + 1)
+            cut = val >= beta
+        else:
+            val = self.alphabeta(child, alpha, alpha + NULL_WINDOW, reduced, ply + 1)
+            cut = val <= alpha
+        board.unmake_null_move(undo)
+        if cut:
+            self.null_move_cutoffs += 1
+        return cut
+
+    def _is_late_quiet(self, child: Node, killers: list[int]) -> bool:
+        """
+        return true if `child` is a quiet move that late move reductions may
+        search shallower, the search board must be positioned at `child`
+
+        :param child: child reached by the move, not a capture or promotion
+            or check, and not a killer
+        :type child: Node
+        :param killers: killer slots of the ply the move is played at
+        :type killers: list[int]
+        :rtype: bool
+        """
+        move = child.move
+        return not (
+            child.captured != EMPTY
+            or move & PROMOTION
+            or move in killers
+            or self.board.in_check(self.board.turn)
+        )
 
-            if (
-                pc.player == self.agent_player
-                and not isinstance(pc, King)
-                and (
-                    (pc.player.name == "white" and pc.position.y > 0)
-                    or (pc.player.name == "black" and pc.position.y < 4)
-                )
-            ):
-                development += Search.bonus["development"]
-            if name == "pawn" and pc.player == self.agent_player:
-                prog = (
-                    pc.position.y if pc.player.name == "white" else (4 - pc.position.y)
-                )
-                pawn_progress += prog * Search.bonus["pawn_progress"]
+    def evaluate_position(
+        self, moves: list[int], move: int | None = None, captured: int = EMPTY
+    ) -> float:
+        """
+        return score of the search board in agent_player perspective
+
+        :param moves: legal moves of side to move
+        :type moves: list[int]
+        :param move: encoded move that led to the position, None if unknown
+        :type move: int | None
+        :param captured: code of piece captured by `move`, EMPTY if none
+        :type captured: int
+        :return: score of the position
+        :rtype: float
+        """
+        board = self.board
+        agent = self.agent
+        if not moves:
+            # checkmate and stalemate both lose for the side to move
+            return inf if board.turn != agent else -inf
+        if board.only_kings():
+            return 0.0
+        if (
+            self.use_tablebase
+            and (board.occupancy[WHITE] | board.occupancy[BLACK]).bit_count()
+            <= TABLEBASE_PIECES
+        ):
+            score = self._probe_tablebase()
+            if score is not None:
+                return score
+
+        enemy = agent ^ 1
+        enemy_attacks = board.attacks_by(enemy)
+        values = Search._PIECE_VALUES
+        mailbox = board.mailbox
+
+        # placement terms are summed incrementally by the board
+        material = board.material[agent] - board.material[enemy]
+        centre = board.centre[agent] - board.centre[enemy]
+        advance = board.advance[agent]
+        safety = 0.0
+        for square in iter_squares(board.occupancy[agent] & enemy_attacks):
+            safety += Search.bonus["safety"] * values[mailbox[square] % 6]
 
         # mobility
-        mobility = len(node.get_legal_moves()) * Search.bonus["mobility"]
-        mobility = mobility if node.current_player == self.agent_player else -mobility
+        mobility = len(moves) * Search.bonus["mobility"]
+        mobility = mobility if board.turn == agent else -mobility
 
         king_safety = 0.0
-        my_king = node.kings[self.agent_player.name.lower()]
-        opp_king = node.kings[opponent.name.lower()]
-
-        if isinstance(my_king, King) and my_king.is_attacked():
+        if board.in_check(agent):
             king_safety -= Search.bonus["king_safety"]
-        if isinstance(opp_king, King) and opp_king.is_attacked():
-            if not opp_king.get_move_options():
+        if board.in_check(enemy):
+            # checked king with no move of its own, mated unless the check
+            # can be blocked or the checker taken
+            if board.king_trapped(enemy):
                 king_safety += Search.bonus["checkmate"]
             else:
                 king_safety += Search.bonus["enemy_king_safety"]
 
         move_bonus = 0.0
-        if node.move:
-            piece, mv = node.move
-            piece_val = self.MAP_PIECE_TO_VALUE.get(piece.name.lower(), 0)
-
-            if getattr(mv, "captures", None):
-                capture_gain = 0
-                for cap_sq in mv.captures:
-                    victim = node.board[cap_sq].piece
-                    if victim:
-                        victim_val = self.MAP_PIECE_TO_VALUE.get(victim.name.lower(), 0)
-                        capture_gain += victim_val
-                move_bonus += Search.bonus["capture"] * capture_gain
-
-            if piece.name.lower() == "pawn" and mv.position.y in (0, 4):
+        if move is not None:
+            to = (move >> 5) & 31
+            mover = board.turn ^ 1
+            piece_val = values[mailbox[to] % 6]
+
+            if captured != EMPTY:
+                move_bonus += Search.bonus["capture"] * values[captured % 6]
+
+            if move & PROMOTION:
                 move_bonus += Search.bonus["promotion"]
 
-            if self._is_check_move(node, piece, mv):
+            if board.in_check(board.turn):
                 move_bonus += Search.bonus["check"]
 
-            if mv.position in opponent_attacks:
+            if board.attack_count(board.turn, to):
                 move_bonus += Search.bonus["unsafe_move"] * piece_val
 
-            if node.is_defended_by(self.agent_player, mv.position):
+            if board.attack_count(mover, to):
                 move_bonus += Search.bonus["protected"]
 
+            # move terms are scored for the side that made the move
+            move_bonus = move_bonus if mover == agent else -move_bonus
+
         return (
             material
             + centre
-            + development
-            + pawn_progress
+            + advance
             + safety
             + mobility
             + king_safety
             + move_bonus
         )
 
-    def _score_child(self, child: Node) -> float:
-        """aggressive evaluation for what nodes to expand first, agent_player independent evaluation"""
+    def _probe_tablebase(self, ply: int = 0) -> float | None:
+        """
+        score of the search board from the tablebases in agent_player
+        perspective, quicker wins and slower losses score higher
+
+        :param ply: distance of the position from the root
+        :type ply: int
+        :return: score of the position, None if no table covers it
+        :rtype: float | None
+        """
+        hit = Tablebase.probe(self.board)
+        if hit is None:
+            return None
+        self.tablebase_hits += 1
+        result, plies = hit
+        if not result:
+            return 0.0
+        score = Search.TABLEBASE_SCORE - ply - plies
+        return score if (result > 0) == (self.board.turn == self.agent) else -score
+
+    def _score_child(self, child: Node, exchange: float | None = None) -> float:
+        """aggressive evaluation for what nodes to expand first, scored for the side that moved,
+        the search board must be positioned at `child`, captures are scored by
+        their static `exchange` value when given, else by victim minus attacker"""
         if child.move is None:
             return 0
-        piece, mv = child.move
-        opponent = child.previous_player
-        opponent_attacks = child.attacks_by(opponent)
-        opp_king = child.kings[opponent.name.lower()]
+        board = self.board
+        mv = child.move
+        to = (mv >> 5) & 31
+        mover = board.turn ^ 1
 
         move_bonus = 0.0
-        piece_val = self.MAP_PIECE_TO_VALUE.get(piece.name.lower(), 0)
-        if getattr(mv, "captures", None):
-            delta = 0
-            for cap_sq in mv.captures:
-                victim = child.board[cap_sq].piece
-                if victim:
-                    victim_val = self.MAP_PIECE_TO_VALUE.get(victim.name.lower(), 0)
-                    delta += victim_val - piece_val
-            move_bonus += delta * Search.bonus["capture"] * 1.4
+        piece_val = Search._PIECE_VALUES[board.mailbox[to] % 6]
+        if child.captured != EMPTY:
+            if exchange is None:
+                exchange = Search._PIECE_VALUES[child.captured % 6] - piece_val
+            move_bonus += exchange * Search.bonus["capture"] * 1.4
         # promotion
-        if piece.name.lower() == "pawn" and mv.position.y in (0, 4):
+        if mv & PROMOTION:
             move_bonus += Search.bonus["promotion"] * 1.2
         # checks
-        if isinstance(opp_king, King) and opp_king.is_attacked():
+        if board.in_check(board.turn):
             move_bonus += Search.bonus["check"] * 1.1
         # unsafe move
-        if mv.position in opponent_attacks:
+        if child.is_defended_by(board, board.turn, to):
             move_bonus += Search.bonus["unsafe_move"] * piece_val * 1.3
         # protected
-        if child.is_defended_by(self.agent_player, mv.position):
+        if child.is_defended_by(board, mover, to):
             move_bonus += Search.bonus["protected"] * 1.0
         return move_bonus
 
-    def get_ordered_children(self, node: Node) -> list[Node]:
-        """return list of ordered children highest heuristic eval"""
-        if not node.children:
-            node.expand()
+    def iter_moves(
+        self, node: Node, first_move: int = 0, ply: int = 0
+    ) -> Iterator[int]:
+        """
+        yield legal moves of `node` in stages, each stage is only sorted
+        when the search gets to it, so a cutoff early on leaves the rest
+        unscored and no child node is made for a move that is never played
+
+        stages are `first_move` (usually the hash move), captures and
+        promotions that do not lose material by static exchange, the killer
+        slots of `ply`, quiet moves by heuristic score and history, and last
+        the losing captures
+
+        :param node: node whose moves are searched, the board is at it
+            whenever the iterator is advanced
+        :type node: Node
+        :param first_move: encoded move to try first, 0 if none
+        :type first_move: int
+        :param ply: distance of `node` from the root, selects killer slots
+        :type ply: int
+        :return: iterator over encoded moves
+        :rtype: Iterator[int]
+        """
+        board = self.board
+        moves = node.get_legal_moves(board)
+        if first_move and first_move in moves:
+            yield first_move
+        enemy = board.occupancy[board.turn ^ 1]
+        mailbox = board.mailbox
+        values = Search._PIECE_VALUES
+        use_see = self.use_see
+        captures: list[tuple[float, int]] = []
+        quiets: list[int] = []
+        for mv in moves:
+            if mv == first_move:
+                continue
+            to = (mv >> 5) & 31
+            if enemy & (1 << to) or mv & (EN_PASSANT | PROMOTION):
+                if use_see:
+                    exchange = board.see(mv)
+                else:
+                    # most valuable victim, least valuable attacker, a
+                    # promotion gains the queen it becomes as in see
+                    if mv & EN_PASSANT:
+                        exchange = values[PAWN]
+                    elif mailbox[to] != EMPTY:
+                        exchange = values[mailbox[to] % 6]
+                    else:
+                        exchange = 0
+                    if mv & PROMOTION:
+                        exchange += values[QUEEN] - values[PAWN]
+                    exchange -= values[mailbox[mv & 31] % 6]
+                captures.append((exchange, mv))
+            else:
+                quiets.append(mv)
+        captures.sort(reverse=True)
+        losing: list[int] = []
+        for exchange, mv in captures:
+            if exchange < 0:
+                losing.append(mv)
+            else:
+                yield mv
+
+        for killer in self.killers[ply][:]:
+            if killer in quiets:
+                quiets.remove(killer)
+                yield killer
+
+        history = self.history[board.turn]
+        history_scale = Search.HISTORY_WEIGHT / self.history_max
+        scored = [
+            (self._score_quiet(mv) + history[mv & 1023] * history_scale, mv)
+            for mv in quiets
+        ]
+        scored.sort(reverse=True)
+        for _, mv in scored:
+            yield mv
+        yield from losing
+
+    def _score_quiet(self, move: int) -> float:
+        """
+        heuristic score of a quiet move for ordering, read from the attack
+        maps of the search board before the move is played, the same terms
+        `_score_child` gives after it
+
+        :param move: encoded quiet move of side to move
+        :type move: int
+        :return: ordering score for the side to move
+        :rtype: float
+        """
+        board = self.board
+        us = board.turn
+        frm, to = move & 31, (move >> 5) & 31
+        score = 0.0
+        if board.gives_check(move):
+            score += Search.bonus["check"] * 1.1
+        if board.attack_count(us ^ 1, to):
+            piece_val = Search._PIECE_VALUES[board.mailbox[frm] % 6]
+            score += Search.bonus["unsafe_move"] * piece_val * 1.3
+        # the moving piece does not defend the square it moves to
+        defenders = board.attack_count(us, to)
+        if board.piece_attacks(frm) & (1 << to):
+            defenders -= 1
+        if defenders:
+            score += Search.bonus["protected"] * 1.0
+        return score
+
+    def get_ordered_children(self, node: Node, ply: int = 0) -> list[Node]:
+        """return list of ordered children highest heuristic eval,
+        quiet moves are lifted by the killer slots of `ply` and their history"""
+        board = self.board
+        node.expand(board)
         for child in node.children:
             if child.order_score is None:
-                child.order_score = self._score_child(child)
-        node.children.sort(key=lambda n: n.order_score, reverse=True)
+                exchange = None
+                if self.use_see and child.captured != EMPTY:
+                    exchange = board.see(child.move)
+                undo = board.make_move(child.move)
+                child.order_score = self._score_child(child, exchange)
+                board.unmake_move(undo)
+        killers = self.killers[ply]
+        history = self.history[board.turn]
+        history_scale = Search.HISTORY_WEIGHT / self.history_max
+
+        def order_key(child: Node) -> float:
+            move = child.move
+            if child.captured != EMPTY or move & PROMOTION:
+                return child.order_score
+            score = child.order_score + history[move & 1023] * history_scale
+            if move == killers[0]:
+                return score + Search.KILLER_BONUS[0]
+            if move == killers[1]:
+                return score + Search.KILLER_BONUS[1]
+            return score
+
+        node.children.sort(key=order_key, reverse=True)
         return node.children
 
+    def reset_heuristics(self) -> None:
+        """clear the killer slots and history table"""
+        self.killers = [[0, 0] for _ in range(MAX_SEARCH_DEPTH + 1)]
+        self.history = [[0] * 1024, [0] * 1024]
+        self.history_max = 1
+
+    def age_heuristics(self) -> None:
+        """carry the killer slots and history over to a root two plies on,
+        slots of ply p become those of ply p - 2 and history is halved"""
+        self.killers = self.killers[2:] + [[0, 0], [0, 0]]
+        for table in self.history:
+            table[:] = [score >> 1 for score in table]
+        self.history_max = max(1, self.history_max >> 1)
+
+    def _record_cutoff(self, child: Node, ply: int, depth: int) -> None:
+        """
+        remember a quiet move that caused a beta cutoff, as killer of `ply`
+        and in the history table of the side that played it
+
+        :param child: child whose move caused the cutoff
+        :type child: Node
+        :param ply: distance from the root of the node that was cut
+        :type ply: int
+        :param depth: remaining depth of the node that was cut
+        :type depth: int
+        """
+        move = child.move
+        if child.captured != EMPTY or move & PROMOTION:
+            return
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        history = self.history[self.board.turn]
+        history[move & 1023] += depth * depth
+        self.history_max = max(self.history_max, history[move & 1023])
+
+
+def build_piece_square_tables() -> tuple[list[float], list[float], list[float]]:
+    """
+    generate the flat placement tables from the Search weights, each indexed
+    by piece code * NUM_SQUARES + square, with the piece code folding in the
+    colour
+
+    :return: material, centre and advance (development plus pawn progress)
+        tables
+    :rtype: tuple[list[float], list[float], list[float]]
+    """
+    material = [0.0] * (12 * NUM_SQUARES)
+    centre = [0.0] * (12 * NUM_SQUARES)
+    advance = [0.0] * (12 * NUM_SQUARES)
+    for code in range(12):
+        name = PIECE_NAMES[code % 6]
+        home_rank = PROMOTION_RANK[(code // 6) ^ 1]
+        for square in range(NUM_SQUARES):
+            x, y = square % BOARD_SIZE, square // BOARD_SIZE
+            index = code * NUM_SQUARES + square
+            material[index] = Search.MAP_PIECE_TO_VALUE[name]
+            if (x, y) in Search.CENTRE_SQUARES:
+                centre[index] = (
+                    Search.bonus["centre"] * Search.MAP_PIECE_CENTER_TO_VALUE[name]
+                )
+            if name != "king" and y != home_rank:
+                advance[index] += Search.bonus["development"]
+            if name == "pawn":
+                advance[index] += abs(y - home_rank) * Search.bonus["pawn_progress"]
+    return material, centre, advance
+
+
+# placement tables summed per colour by BitBoard._put and BitBoard._remove
+PSQ_MATERIAL, PSQ_CENTRE, PSQ_ADVANCE = build_piece_square_tables()
+
+# exchange values for BitBoard.see, the king outranks everything so it only
+# recaptures last and never into an attacked square
+SEE_VALUES = tuple(
+    Search.SEE_KING_VALUE if name == "king" else Search.MAP_PIECE_TO_VALUE[name]
+    for name in PIECE_NAMES
+)
+# piece types by rising exchange value, order attackers are taken in
+SEE_ORDER = tuple(sorted(range(6), key=SEE_VALUES.__getitem__))
+
+
+def _helper_search(
+    z_keys: list[int],
+    board: BitBoard,
+    colour_name: str,
+    tt_name: str,
+    tt_size_mb: float,
+    generation: int,
+    worker: int,
+    depth: int | None,
+    time_limit: float | None,
+    stop: Any,
+    results: Any,
+) -> None:
+    """
+    body of a lazy SMP helper process, search `board` into the shared
+    table named `tt_name` and put (depth, score, move) of every completed
+    iteration on `results` until `stop` is raised or the time runs out
+
+    :param z_keys: zobrist keys of the main process, hashes must agree
+    :type z_keys: list[int]
+    :param board: root position
+    :type board: BitBoard
+    :param colour_name: colour the agent plays
+    :type colour_name: str
+    :param tt_name: name of the shared transposition table
+    :type tt_name: str
+    :param tt_size_mb: size the table was made with
+    :type tt_size_mb: float
+    :param generation: age of the table in the main process
+    :type generation: int
+    :param worker: helper number from 1, picks depth offset and root order
+    :type worker: int
+    :param depth: deepest iteration to search, unlimited if None
+    :type depth: int | None
+    :param time_limit: seconds the search may take, unlimited if None
+    :type time_limit: float | None
+    :param stop: flag raised by the main process to end the search
+    :type stop: multiprocessing.sharedctypes.Synchronized
+    :param results: queue read by the main process
+    :type results: multiprocessing.Queue
+    """
+    BitBoard._z_keys = z_keys
+    tt = TranspositionTable(tt_size_mb, name=tt_name)
+    engine = Search(board.to_board(), colour_name, tt)
+    engine.workers = 0
+    engine.tt.generation = generation
+    engine.depth_offset = worker & 1
+    engine.root_rotation = worker
+    engine.report = lambda done, score, move: results.put((done, score, move))
+    engine.stop_signal = stop
+    try:
+        engine.search(depth, time_limit)
+    finally:
+        tt.close()
+
+
+def build_opening_book(
+    layouts: list[Board],
+    path: str = BOOK_PATH,
+    plies: int = BOOK_PLIES,
+    time_limit: float = 10.0,
+    depth: int | None = None,
+) -> int:
+    """
+    search the first `plies` plies of each layout and write the best move
+    of every position the agent can face to `path`, for either colour the
+    agent moves by the book and every reply of the opponent is followed
+
+    :param layouts: starting positions, white to move
+    :type layouts: list[Board]
+    :param path: book file to write
+    :type path: str
+    :param plies: plies from the start the book covers
+    :type plies: int
+    :param time_limit: seconds searched per position
+    :type time_limit: float
+    :param depth: deepest iteration searched per position, unlimited if None
+    :type depth: int | None
+    :return: number of positions in the book
+    :rtype: int
+    """
+    book = OpeningBook()
+
+    def fill(board: BitBoard, colour: int, plies_left: int) -> None:
+        moves = board.legal_moves()
+        if plies_left == 0 or not moves:
+            return
+        if board.turn == colour:
+            key = board.position_key()
+            move = book.moves.get(key)
+            if move is None:
+                engine = Search(board.to_board(), COLOUR_NAMES[colour])
+                engine.use_book = False
+                engine.search(depth, time_limit)
+                move = book.moves[key] = engine.best_move
+            moves = [move]
+        for move in moves:
+            undo = board.make_move(move)
+            fill(board, colour, plies_left - 1)
+            board.unmake_move(undo)
+
+    for layout in layouts:
+        for colour in (WHITE, BLACK):
+            fill(BitBoard.from_board(layout), colour, plies)
+    book.save(path)
+    OpeningBook._default = None
+    return len(book.moves)
+
+
+def build_tablebases(directory: str = TABLEBASE_DIR) -> list[str]:
+    """
+    solve every table of Tablebase.signatures by retrograde analysis and
+    write them to `directory`
+
+    :param directory: folder the .tb files are written to
+    :type directory: str
+    :return: names of the tables written
+    :rtype: list[str]
+    """
+    os.makedirs(directory, exist_ok=True)
+    solved: dict[str, bytes] = {}
+    for name in Tablebase.signatures():
+        solved[name] = bytes(_solve_tablebase(name, solved))
+        with open(os.path.join(directory, name + ".tb"), "wb") as file:
+            file.write(solved[name])
+    Tablebase._files.clear()
+    return list(solved)
+
+
+def _solve_tablebase(name: str, solved: dict[str, bytes]) -> bytearray:
+    """
+    solve the table `name`, positions with no legal move are lost, a
+    position is won in n plies if a move leads to a loss in n - 1 and lost
+    in n if every move leads to a win and the slowest takes n - 1, what is
+    left once no more positions resolve is a draw
+
+    :param name: signature such as KQvKN
+    :type name: str
+    :param solved: tables already solved, every table a capture or
+        promotion leads into
+    :type solved: dict[str, bytes]
+    :return: one byte per position as Tablebase.decode reads them
+    :rtype: bytearray
+    """
+    codes = [
+        colour * 6 + PIECE_LETTERS.index(letter)
+        for colour, side in enumerate(name.split("v"))
+        for letter in side
+    ]
+    count = len(codes)
+    size = 2 * NUM_SQUARES**count
+    values = bytearray(size)
+    # moves per position not yet known to lead to a win for the opponent
+    moves_left = array("H", bytes(2 * size))
+    # moves staying inside this table, parent and child index
+    edge_parents, edge_children = array("i"), array("i")
+    # plies at which a move out of the table makes its position won or
+    # takes a move off moves_left
+    wins_at: dict[int, list[int]] = {}
+    losing_moves_at: dict[int, list[int]] = {}
+    lost: list[int] = []
+    board = BitBoard()
+    for squares in product(range(NUM_SQUARES), repeat=count):
+        if len(set(squares)) < count or any(
+            code % 6 == PAWN and squares[i] // BOARD_SIZE in PROMOTION_RANK
+            for i, code in enumerate(codes)
+        ):
+            continue
+        for code, square in zip(codes, squares):
+            board._put(code, square)
+            if code % 6 == PAWN and square // BOARD_SIZE == PAWN_START_RANK[code // 6]:
+                board.unmoved_pawns |= 1 << square
+        board.attacks_pending = ALL_SQUARES
+        base = 0
+        for square in squares:
+            base = base * NUM_SQUARES + square
+        for turn in (WHITE, BLACK):
+            board.turn = turn
+            if board.in_check(turn ^ 1):
+                continue
+            index = turn * NUM_SQUARES**count + base
+            moves = board.legal_moves()
+            if not moves:
+                values[index] = Tablebase.LOSS
+                lost.append(index)
+                continue
+            moves_left[index] = len(moves)
+            for move in moves:
+                undo = board.make_move(move)
+                if not board.only_kings():
+                    child_name, child = Tablebase.locate(board)
+                    if child_name == name:
+                        edge_parents.append(index)
+                        edge_children.append(child)
+                    else:
+                        result, plies = Tablebase.decode(solved[child_name][child])
+                        if result < 0:
+                            wins_at.setdefault(plies + 1, []).append(index)
+                        elif result > 0:
+                            losing_moves_at.setdefault(plies + 1, []).append(index)
+                board.unmake_move(undo)
+        for square in squares:
+            board._remove(square)
+        board.unmoved_pawns = 0
+        board.attacks_pending = ALL_SQUARES
+
+    # parents of each position in one flat array, those of position i are
+    # parents[starts[i]:starts[i + 1]]
+    starts = array("i", bytes(4 * (size + 1)))
+    for child in edge_children:
+        starts[child + 1] += 1
+    for i in range(size):
+        starts[i + 1] += starts[i]
+    parents = array("i", bytes(4 * len(edge_children)))
+    fill = array("i", starts)
+    for parent, child in zip(edge_parents, edge_children):
+        parents[fill[child]] = parent
+        fill[child] += 1
+    del edge_parents, edge_children, fill
+
+    solved_at = set(lost)
+    won: list[int] = []
+    plies = 0
+    last = max([*wins_at, *losing_moves_at], default=0)
+    while lost or won or plies < last:
+        plies += 1
+        if plies >= Tablebase.LOSS:
+            raise ValueError(f"{name} has results beyond {Tablebase.LOSS - 1} plies")
+        new_won = []
+        candidates = [
+            parents[k] for child in lost for k in range(starts[child], starts[child + 1])
+        ]
+        for parent in candidates + wins_at.get(plies, []):
+            if parent not in solved_at:
+                solved_at.add(parent)
+                values[parent] = plies
+                new_won.append(parent)
+        new_lost = []
+        candidates = [
+            parents[k] for child in won for k in range(starts[child], starts[child + 1])
+        ]
+        for parent in candidates + losing_moves_at.get(plies, []):
+            moves_left[parent] -= 1
+            if not moves_left[parent] and parent not in solved_at:
+                solved_at.add(parent)
+                values[parent] = Tablebase.LOSS + plies
+                new_lost.append(parent)
+        won, lost = new_won, new_lost
+    return values
+
+
+def _read_var(var: Any) -> tuple[Any, float]:
+    """return ply and thinking time budget from `var`, [ply, THINKING_TIME_BUDGET]"""
+    if isinstance(var, (list, tuple)) and len(var) > 1:
+        return var[0], float(var[1])
+    return var, THINKING_TIME_BUDGET
+
 
 def agent(board, player, var):
-    print(f"Ply: {var[0]}")
-    ai = Search(board, player)
-    piece, move_opt = ai.search(3)
+    ply, budget = _read_var(var)
+    print(f"Ply: {ply}")
+    ai = Search.for_player(board, player)
+    piece, move_opt = ai.search(time_limit=budget * MOVE_TIME_RATIO)
     return piece, move_opt
+
+
+def end_game():
+    """flush the transposition table of each agent to TT_FILE, if set"""
+    if TT_FILE is None:
+        return
+    for colour, table in TranspositionTable._tables.items():
+        table.flush(TranspositionTable.file_for(colour), colour)
+
+
+def ponder(player):
+    """search on the opponent's time for the engine of `player` until
+    stop_ponder is called, does nothing before its first move"""
+    engine = Search._engines.get(colour_of(player))
+    if engine is not None:
+        engine.ponder()
+
+
+def stop_ponder(player):
+    """make a running ponder of `player` return soon"""
+    engine = Search._engines.get(colour_of(player))
+    if engine is not None:
+        engine.stop()